@@ -1,9 +1,20 @@
-import requests
+import asyncio
 import json
+import random
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
 
 SERVER_URL = "http://127.0.0.1:5000"
 
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "ERROR")
+
+# Keep-alive connection pool shared by the synchronous helpers below
+SESSION = requests.Session()
+
 def discover_and_submit_task(prompt):
     """
     Standard process: Discover Agent Card -> Submit Task.
@@ -14,7 +25,7 @@ def discover_and_submit_task(prompt):
     print(f"[CLIENT]: Finding Agent Card at: {agent_card_url}")
     
     try:
-        response = requests.get(agent_card_url)
+        response = SESSION.get(agent_card_url)
         response.raise_for_status() # Raise error if status code is not 2xx
         agent_card = response.json()
         
@@ -40,11 +51,21 @@ def discover_and_submit_task(prompt):
     print(f"[CLIENT]: Sending Task to: {task_endpoint}")
     
     try:
-        response = requests.post(
+        response = SESSION.post(
             task_endpoint, 
             json=task_payload,
             headers={'Content-Type': 'application/json'}
         )
+        # Server queue is full -> wait as instructed and retry once
+        if response.status_code == 429:
+            retry_after = int(response.headers.get("Retry-After", 5))
+            print(f"[CLIENT]: Server busy (429). Retrying in {retry_after} seconds...")
+            time.sleep(retry_after)
+            response = SESSION.post(
+                task_endpoint, 
+                json=task_payload,
+                headers={'Content-Type': 'application/json'}
+            )
         response.raise_for_status()
         
         task_status = response.json()
@@ -59,28 +80,121 @@ def discover_and_submit_task(prompt):
         print(f"[CLIENT]: Error submitting Task: {e}")
         return
 
-    # --- 4. POLLING STATUS (Wait for result) ---
+    # --- 4. WAIT FOR RESULT (push if supported, polling otherwise) ---
     task_id = task_status['task_id']
-    poll_task_status(task_id)
+    wait_for_task(task_id, agent_card)
+
+def wait_for_task(task_id, agent_card):
+    """Pick the best way to follow a Task based on what the Agent Card advertises."""
+    capabilities = agent_card.get("capabilities", [])
+    if "task_events_sse" in capabilities and stream_task_events(task_id):
+        return
+    if "task_long_poll" in capabilities:
+        long_poll_task_status(task_id)
+    else:
+        poll_task_status(task_id)
+
+def fetch_final_result(task_id):
+    response = SESSION.get(f"{SERVER_URL}/tasks/{task_id}")
+    response.raise_for_status()
+    data = response.json()
+    print(f"\n[CLIENT]: Task finished! Status: {data.get('status')}")
+    process_result(data.get("result"), task_id)
+
+def stream_task_events(task_id):
+    """
+    Follow a Task through its Server-Sent Events stream, printing agent logs live.
+    Returns True when the Task finished, False if the stream could not be used.
+    """
+    events_url = f"{SERVER_URL}/tasks/{task_id}/events"
+    print(f"[CLIENT]: Subscribing to live events for Task {task_id}...")
+    
+    try:
+        with SESSION.get(events_url, stream=True, headers={"Accept": "text/event-stream"}, timeout=(5, 60)) as response:
+            if response.status_code != 200:
+                print(f"[CLIENT]: Event stream unavailable ({response.status_code}), falling back to polling.")
+                return False
+            
+            event_type, data_lines = "message", []
+            for line in response.iter_lines(decode_unicode=True):
+                if line is None or line.startswith(":"):
+                    continue # keep-alive comment
+                if line == "":
+                    # Blank line = dispatch event
+                    if data_lines:
+                        data = json.loads("\n".join(data_lines))
+                        if event_type == "log":
+                            print(data.get("message", ""))
+                        elif event_type == "status":
+                            status = data.get("status")
+                            print(f"[CLIENT]: Status changed: {status}")
+                            if status in ["COMPLETED", "FAILED", "ERROR"]:
+                                fetch_final_result(task_id)
+                                return True
+                    event_type, data_lines = "message", []
+                elif line.startswith("event:"):
+                    event_type = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[len("data:"):].strip())
+    except requests.exceptions.RequestException as e:
+        print(f"[CLIENT]: Event stream error: {e}, falling back to polling.")
+    return False
+
+def long_poll_task_status(task_id, wait_seconds=30):
+    """Long-poll: each request is held by the Server until the status changes."""
+    status_url = f"{SERVER_URL}/tasks/{task_id}"
+    print(f"[CLIENT]: Long-polling status for Task {task_id}...")
+    last_status = None
+    
+    while True:
+        params = {"wait": wait_seconds}
+        if last_status:
+            params["status"] = last_status
+        try:
+            response = SESSION.get(status_url, params=params, timeout=wait_seconds + 10)
+            if response.status_code != 200:
+                print(f"[CLIENT]: Error checking status: {response.status_code}")
+                time.sleep(5)
+                continue
+            data = response.json()
+            last_status = data.get("status")
+            
+            if last_status in ["COMPLETED", "FAILED", "ERROR"]:
+                print(f"\n[CLIENT]: Task finished! Status: {last_status}")
+                process_result(data.get("result"), task_id)
+                break
+            print(f"[CLIENT]: Current status: {last_status}", end='\r')
+            # The server was too busy to hold the request: it answered at once
+            if "Retry-After" in response.headers:
+                time.sleep(float(response.headers["Retry-After"]))
+                
+        except Exception as e:
+            print(f"[CLIENT]: Polling connection error: {e}")
+            break
 
 def poll_task_status(task_id):
     """Continuously poll Server to see if Task is finished."""
     status_url = f"{SERVER_URL}/tasks/{task_id}"
     print(f"[CLIENT]: Starting to monitor status for Task {task_id}...")
+    etag, data = None, None
     
     while True:
         try:
-            response = requests.get(status_url)
-            if response.status_code == 200:
-                data = response.json()
+            # Conditional GET: 304 Not Modified (empty body) while nothing changed
+            response = SESSION.get(status_url, headers={"If-None-Match": etag} if etag else {})
+            if response.status_code in (200, 304):
+                if response.status_code == 200:
+                    data, etag = response.json(), response.headers.get("ETag")
                 status = data.get("status")
                 
                 if status in ["COMPLETED", "FAILED", "ERROR"]:
                     print(f"\n[CLIENT]: Task finished! Status: {status}")
-                    process_result(data.get("result"))
+                    process_result(data.get("result"), task_id)
                     break
                 else:
-                    # Still running (Running / SUBMITTED)
+                    # Still waiting (QUEUED / Running)
+                    if status == "QUEUED":
+                        status = f"{status} (position {data.get('queue_position')})"
                     print(f"[CLIENT]: Current status: {status}. Waiting 5 seconds...", end='\r')
                     time.sleep(5)
             else:
@@ -91,7 +205,20 @@ def poll_task_status(task_id):
             print(f"[CLIENT]: Polling connection error: {e}")
             break
 
-def process_result(result):
+def download_artifact(task_id, name, filename):
+    """Download a Task artifact (game.py, screenshot.png, logs.txt) to a local file. Returns the path or None."""
+    try:
+        with SESSION.get(f"{SERVER_URL}/tasks/{task_id}/artifacts/{name}", stream=True) as response:
+            response.raise_for_status()
+            with open(filename, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):  # gzip is decoded on the fly
+                    f.write(chunk)
+        return filename
+    except requests.exceptions.RequestException as e:
+        print(f"[CLIENT]: Could not download {name}: {e}")
+        return None
+
+def process_result(result, task_id=None):
     if not result:
         print("[CLIENT]: No result returned.")
         return
@@ -100,25 +227,300 @@ def process_result(result):
     print("RESULT FROM AGENT SERVER")
     print("="*40)
     
+    artifacts = result.get("artifacts") or {}
     if result.get("status") == "COMPLETED":
-        code = result.get("code")
-        if code:
-            filename = "generated_game_result.py"
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(code)
+        filename = "generated_game_result.py"
+        if "game.py" in artifacts and download_artifact(task_id, "game.py", filename):
             print(f"[CLIENT]: Game code saved to file: {filename}")
         
-        screenshot = result.get("screenshot_path")
-        if screenshot:
-            print(f"[CLIENT]: Screenshot captured by server: {screenshot}")
+        if "screenshot.png" in artifacts and download_artifact(task_id, "screenshot.png", "generated_game_screenshot.png"):
+            print("[CLIENT]: Screenshot captured by server saved to: generated_game_screenshot.png")
             
         print("\n[CLIENT]: You can run the game using command: python generated_game_result.py")
     else:
-        print(f"[CLIENT]: Task failed. Message: {result.get('message')}")
-        if result.get('logs'):
+        print(f"[CLIENT]: Task failed. Message: {result.get('message') or result.get('error')}")
+        if "logs.txt" in artifacts and download_artifact(task_id, "logs.txt", "task_logs.txt"):
             print("Last logs:")
-            for log in result['logs'][-5:]:
-                print(log.strip())
+            with open("task_logs.txt", "r", encoding="utf-8") as f:
+                for log in f.read().splitlines()[-5:]:
+                    print(log.strip())
+
+# --- ASYNC CLIENT SDK ---
+# For batch jobs: `async with A2AClient() as client: async for r in client.submit_many(prompts): ...`
+# HTTP calls run on a small thread pool over one keep-alive connection pool (no extra dependencies).
+
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_CONCURRENCY = 16
+AGENT_CARD_TTL = 60         # seconds before the cached Agent Card is revalidated (ETag)
+LONG_POLL_SECONDS = 20      # per request, when the server advertises task_long_poll
+POLL_BASE_SECONDS = 0.5     # first polling delay, doubled while the status does not change
+POLL_MAX_SECONDS = 10.0
+MAX_SUBMIT_RETRIES = 5      # 429 Too Many Requests
+MAX_CONNECTION_ERRORS = 5   # consecutive errors while waiting for a task
+BATCH_SIZE = 100            # tasks per POST /tasks:batch, ids per GET /tasks?ids=...
+
+
+def backoff_delay(attempt, base=POLL_BASE_SECONDS, cap=POLL_MAX_SECONDS):
+    """Exponential backoff with jitter: half fixed, half random, so many clients do not poll in lockstep."""
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class A2AClient:
+    """
+    Asyncio client for an A2A server.
+    - One pooled keep-alive `requests.Session` shared by all calls
+    - Agent Card cached and revalidated with ETag / If-None-Match
+    - 429 handling with Retry-After, backoff polling with jitter
+    - `submit_many()` runs many prompts with bounded concurrency and yields results as tasks finish
+    """
+    def __init__(self, server_url=SERVER_URL, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=30, verbose=False):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.verbose = verbose
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Blocking HTTP calls run here; sized like the connection pool so no call waits for a socket
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="a2a-client")
+        self._agent_card = None
+        self._agent_card_etag = None
+        self._agent_card_fetched_at = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _log(self, message):
+        if self.verbose:
+            print(f"[CLIENT]: {message}")
+
+    async def _request(self, method, path, timeout=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        url = f"{self.server_url}{path}"
+        return await loop.run_in_executor(
+            self._executor,
+            lambda: self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        )
+
+    async def get_agent_card(self, refresh=False):
+        """Agent Card, cached for AGENT_CARD_TTL seconds and then revalidated (304 = unchanged)."""
+        if self._agent_card and not refresh and time.time() - self._agent_card_fetched_at < AGENT_CARD_TTL:
+            return self._agent_card
+        headers = {"If-None-Match": self._agent_card_etag} if self._agent_card_etag else {}
+        response = await self._request("GET", "/.well-known/agent-card.json", headers=headers)
+        if response.status_code != 304 or not self._agent_card:
+            response.raise_for_status()
+            self._agent_card = response.json()
+            self._agent_card_etag = response.headers.get("ETag")
+        self._agent_card_fetched_at = time.time()
+        return self._agent_card
+
+    @staticmethod
+    def task_payload(prompt, priority="normal", options=None, metadata=None):
+        payload = {
+            "prompt": prompt,
+            "client_metadata": {**(metadata or {}), "priority": priority},
+            "artifacts_requested": ["text", "code"]
+        }
+        if options:
+            payload["options"] = options
+        return payload
+
+    async def submit(self, prompt, priority="normal", options=None, metadata=None):
+        """POST /tasks. Waits and retries on 429 (Retry-After). Returns the submission response."""
+        payload = self.task_payload(prompt, priority, options, metadata)
+        for attempt in range(MAX_SUBMIT_RETRIES + 1):
+            response = await self._request("POST", "/tasks", json=payload)
+            if response.status_code != 429 or attempt == MAX_SUBMIT_RETRIES:
+                break
+            retry_after = float(response.headers.get("Retry-After", 5))
+            self._log(f"Server busy (429). Retrying in {retry_after:.0f} seconds...")
+            await asyncio.sleep(retry_after + random.uniform(0, retry_after / 2))
+        response.raise_for_status()
+        return response.json()
+
+    async def submit_batch(self, payloads):
+        """POST /tasks:batch. Returns one outcome per payload; rejected ones carry "status_code": 429."""
+        response = await self._request("POST", "/tasks:batch", json={"tasks": payloads})
+        response.raise_for_status()
+        return response.json()["tasks"]
+
+    async def get_statuses(self, task_ids, fields=("status",)):
+        """GET /tasks?ids=...: {task_id: {selected fields}} for many Tasks in one request."""
+        statuses = {}
+        for start in range(0, len(task_ids), BATCH_SIZE):
+            chunk = task_ids[start:start + BATCH_SIZE]
+            response = await self._request("GET", "/tasks", params={"ids": ",".join(chunk), "fields": ",".join(fields)})
+            response.raise_for_status()
+            statuses.update({task["task_id"]: task for task in response.json()["tasks"]})
+        return statuses
+
+    async def get_task(self, task_id):
+        response = await self._request("GET", f"/tasks/{task_id}")
+        response.raise_for_status()
+        return response.json()
+
+    async def download_artifact(self, task_id, name):
+        """Bytes of a Task artifact ("game.py", "screenshot.png", "logs.txt"), listed in result["artifacts"]."""
+        response = await self._request("GET", f"/tasks/{task_id}/artifacts/{name}")
+        response.raise_for_status()
+        return response.content
+
+    async def wait(self, task_id):
+        """Wait until a Task finishes. Returns the final GET /tasks/<task_id> response."""
+        card = await self.get_agent_card()
+        long_poll = "task_long_poll" in card.get("capabilities", [])
+        last_status, attempt, errors = None, 0, 0
+        etag, data = None, None
+        while True:
+            params = {"wait": LONG_POLL_SECONDS, "status": last_status} if long_poll and last_status else {}
+            headers = {"If-None-Match": etag} if etag else {}
+            try:
+                response = await self._request(
+                    "GET", f"/tasks/{task_id}", params=params, headers=headers, timeout=self.timeout + LONG_POLL_SECONDS
+                )
+                response.raise_for_status()
+                errors = 0
+            except requests.exceptions.RequestException as e:
+                errors += 1
+                if errors > MAX_CONNECTION_ERRORS:
+                    raise
+                self._log(f"Error checking Task {task_id}: {e}")
+                await asyncio.sleep(backoff_delay(errors))
+                continue
+
+            if response.status_code != 304:  # 304: unchanged since the last answer
+                data, etag = response.json(), response.headers.get("ETag")
+            status = data.get("status")
+            if status in TERMINAL_STATUSES:
+                return data
+            if "Retry-After" in response.headers:
+                # The server was too busy to hold the long-poll and answered at once
+                await asyncio.sleep(float(response.headers["Retry-After"]))
+            if status != last_status:
+                self._log(f"Task {task_id}: {status}")
+                last_status, attempt = status, 0
+                if long_poll:
+                    continue  # next request is held by the server until the status changes
+            elif long_poll:
+                continue  # long-poll timed out without a change
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def run(self, prompt, **submit_kwargs):
+        """Submit one prompt and wait for it. Returns {"prompt", "task_id", "status", "result", "error"}."""
+        outcome = {"prompt": prompt, "task_id": None, "status": None, "result": None, "error": None}
+        try:
+            submission = await self.submit(prompt, **submit_kwargs)
+            outcome["task_id"] = submission["task_id"]
+            final = await self.wait(submission["task_id"])
+            outcome.update(status=final.get("status"), result=final.get("result"))
+        except Exception as e:
+            outcome.update(status="ERROR", error=str(e))
+        return outcome
+
+    async def submit_many(self, prompts, concurrency=DEFAULT_CONCURRENCY, **submit_kwargs):
+        """
+        Run many prompts with at most `concurrency` tasks in flight at once.
+        Async generator: yields each `run()` outcome (plus its "index" in `prompts`) as soon as it finishes.
+        """
+        card = await self.get_agent_card()
+        capabilities = card.get("capabilities", [])
+        if "task_batch" in capabilities and "task_bulk_status" in capabilities:
+            async for outcome in self._submit_many_batched(prompts, concurrency, **submit_kwargs):
+                yield outcome
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(index, prompt):
+            async with semaphore:
+                outcome = await self.run(prompt, **submit_kwargs)
+            outcome["index"] = index
+            return outcome
+
+        pending = [asyncio.ensure_future(run_one(i, p)) for i, p in enumerate(prompts)]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                yield await next_done
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+    async def _submit_many_batched(self, prompts, concurrency, **submit_kwargs):
+        """
+        submit_many() for servers with task_batch + task_bulk_status: prompts are submitted in
+        batches and all in-flight Tasks are tracked with one bulk status query per polling round.
+        Full results are only downloaded for finished Tasks.
+        """
+        waiting = deque(enumerate(prompts))
+        in_flight = {}  # task_id -> (index, prompt)
+        attempt = 0
+        while waiting or in_flight:
+            progressed = False
+            free = min(concurrency - len(in_flight), BATCH_SIZE, len(waiting))
+            if free > 0:
+                chunk = [waiting.popleft() for _ in range(free)]
+                try:
+                    outcomes = await self.submit_batch([self.task_payload(p, **submit_kwargs) for _, p in chunk])
+                except requests.exceptions.RequestException as e:
+                    outcomes = [{"status_code": 0, "error": str(e)}] * len(chunk)
+                rejected = []
+                for (index, prompt), submitted in zip(chunk, outcomes):
+                    if "task_id" in submitted:
+                        in_flight[submitted["task_id"]] = (index, prompt)
+                        progressed = True
+                    elif submitted["status_code"] == 429:
+                        rejected.append((index, prompt))  # queue full: resubmit later, keeping the order
+                    else:
+                        yield {"index": index, "prompt": prompt, "task_id": None, "status": "ERROR",
+                               "result": None, "error": submitted.get("error")}
+                waiting.extendleft(reversed(rejected))
+                if rejected and not in_flight:
+                    self._log("Server busy (429). Waiting before resubmitting...")
+
+            if in_flight:
+                try:
+                    statuses = await self.get_statuses(list(in_flight))
+                except requests.exceptions.RequestException as e:
+                    self._log(f"Error checking statuses: {e}")
+                    statuses = {}
+                for task_id, task in statuses.items():
+                    if task.get("status") in TERMINAL_STATUSES or task.get("error"):
+                        index, prompt = in_flight.pop(task_id)
+                        outcome = {"index": index, "prompt": prompt, "task_id": task_id, "status": "ERROR",
+                                   "result": None, "error": task.get("error")}
+                        if not task.get("error"):
+                            try:
+                                final = await self.get_task(task_id)
+                                outcome.update(status=final.get("status"), result=final.get("result"))
+                            except requests.exceptions.RequestException as e:
+                                outcome["error"] = str(e)
+                        progressed = True
+                        yield outcome
+
+            if progressed:
+                attempt = 0
+            elif waiting or in_flight:
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+
+
+def run_tasks(prompts, server_url=SERVER_URL, concurrency=DEFAULT_CONCURRENCY, **submit_kwargs):
+    """Synchronous wrapper for simple scripts: run all prompts, return the outcomes in input order."""
+    async def collect():
+        async with A2AClient(server_url, max_connections=concurrency + 1) as client:
+            return [outcome async for outcome in client.submit_many(prompts, concurrency, **submit_kwargs)]
+    return sorted(asyncio.run(collect()), key=lambda outcome: outcome["index"])
 
 if __name__ == '__main__':
     user_request = "Write a simple snake game using Pygame library."
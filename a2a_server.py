@@ -1,11 +1,61 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
+import hashlib
+import json
+import os
+import threading
 import time
 import uuid
-import threading
+from artifact_store import ARTIFACTS
+from execution_sandbox import clamp_execution_timeouts, get_display_pool
+from execution_zygote import get_zygote_pool
 from game_maker_agent import process_task
+from llm_backend import LLM
+from metrics import TASK_SECONDS, TASKS_FINISHED, render_gauges, render_metrics
+from task_coalescer import TaskCoalescer, coalesce_key
+from task_events import TaskEventHub, TERMINAL_STATUSES
+from task_scheduler import StoreTaskQueue, TaskScheduler, QueueFullError, parse_priority
+from task_store import TASK_FIELDS, TASK_TTL_SECONDS, create_task_store, stored_result
 
 app = Flask(__name__)
-PORT = 5000
+PORT = int(os.getenv("A2A_PORT", "5000"))
+
+# Where tasks run: "inline" (worker threads in this process) or "external"
+# (separate `python a2a_worker.py` processes sharing the SQLite task store)
+EXECUTION_MODE = os.getenv("A2A_EXECUTION_MODE", "inline")
+# External mode: how often progress of runs is mirrored to coalesced followers (seconds)
+EXTERNAL_FOLLOW_INTERVAL = 0.5
+# Threads serving HTTP when waitress is installed
+HTTP_THREADS = int(os.getenv("A2A_HTTP_THREADS", "16"))
+
+# Worker pool size and queue bound (admission control)
+MAX_WORKERS = int(os.getenv("A2A_MAX_WORKERS", "2"))
+MAX_QUEUE_SIZE = int(os.getenv("A2A_MAX_QUEUE_SIZE", "20"))
+
+# How long a successful result is served to identical new submissions (seconds)
+RESULT_REUSE_TTL = int(os.getenv("A2A_RESULT_REUSE_TTL", "600"))
+
+# How often finished tasks older than A2A_TASK_TTL are evicted from the task store (seconds)
+TASK_EVICT_INTERVAL = 60
+
+# Most tasks per POST /tasks:batch and ids per GET /tasks?ids=...
+MAX_BATCH_SIZE = int(os.getenv("A2A_MAX_BATCH_SIZE", "100"))
+# Fields a bulk status query can select
+TASK_VIEW_FIELDS = (
+    "status", "queue_position", "coalesced_with", "reused_from",
+    "created_at", "started_at", "finished_at", "result"
+)
+
+# Artifacts never change once written (content-addressed), so clients may cache them
+ARTIFACT_MAX_AGE = 3600
+
+# Push-based status delivery (SSE heartbeat interval, max long-poll wait)
+SSE_HEARTBEAT_SECONDS = 15
+MAX_LONG_POLL_SECONDS = 60
+# SSE streams and long-polls each hold an HTTP thread while they wait; together at most this many.
+# Past it, GET /tasks/<id>/events answers 503 (clients fall back to long-polling) and a long-poll
+# answers at once with the current status and Retry-After, so threads stay free for submissions.
+MAX_WAITING_REQUESTS = int(os.getenv("A2A_MAX_WAITING_REQUESTS", str(max(1, HTTP_THREADS // 2))))
+BUSY_RETRY_SECONDS = 2
 
 # --- 1. AGENT CARD (/.well-known/agent-card.json) ---
 # Client Agent will access this file first to know the capabilities of the Server Agent
@@ -14,87 +64,545 @@ AGENT_CARD_DATA = {
     "version": "1.0",
     "description": "Agent specialized in writing Python game code (Tkinter).",
     "serviceEndpoint": f"http://127.0.0.1:{PORT}",
-    "capabilities": ["python_coding", "tkinter_gui"],
+    "capabilities": ["python_coding", "tkinter_gui", "task_events_sse", "task_long_poll", "task_batch", "task_bulk_status"],
     "supported_modalities": ["text"],
     "authRequired": False
 }
 
+# Clients may cache the card this long, then revalidate it with If-None-Match
+AGENT_CARD_MAX_AGE = 60
+
 @app.route('/.well-known/agent-card.json', methods=['GET'])
 def get_agent_card():
-    """Endpoint to publish Agent Card."""
-    return jsonify(AGENT_CARD_DATA)
+    """Endpoint to publish Agent Card (ETag: unchanged cards are answered with 304 Not Modified)."""
+    response = jsonify(AGENT_CARD_DATA)
+    card_bytes = json.dumps(AGENT_CARD_DATA, sort_keys=True).encode("utf-8")
+    response.set_etag(hashlib.sha256(card_bytes).hexdigest()[:32])
+    response.headers["Cache-Control"] = f"max-age={AGENT_CARD_MAX_AGE}"
+    return response.make_conditional(request)
 
 # --- 2. TASK SUBMISSION SYSTEM ---
 
-# In-memory storage for tasks
-# Format: { task_id: { "status": "...", "result": {}, "created_at": ... } }
-TASKS = {}
+# Task records and their append-only event log (status transitions + agent log lines).
+# SQLite by default, so memory stays flat and queued work survives a restart (A2A_TASK_STORE=memory for tests)
+STORE = create_task_store()
+
+# Wakes up SSE / long-poll clients when an event is written to the store
+EVENTS = TaskEventHub(STORE)
+
+# Single-flight: identical submissions share one run, recent results are reused
+COALESCER = TaskCoalescer(result_ttl=RESULT_REUSE_TTL)
+
+# Requests holding an HTTP thread while they wait, by kind, bounded together by MAX_WAITING_REQUESTS
+waiting_requests = {"sse": 0, "long_poll": 0}
+waiting_requests_lock = threading.Lock()
+
+def acquire_wait_slot(kind):
+    """Take a slot for a request that blocks its HTTP thread. False when all MAX_WAITING_REQUESTS are taken."""
+    with waiting_requests_lock:
+        if sum(waiting_requests.values()) >= MAX_WAITING_REQUESTS:
+            return False
+        waiting_requests[kind] += 1
+        return True
+
+def release_wait_slot(kind):
+    with waiting_requests_lock:
+        waiting_requests[kind] -= 1
+
+def task_result(task):
+    """Result as returned to clients: code, logs, screenshot and trace are only referenced, with a download URL each."""
+    result = task["result"]
+    if isinstance(result, dict) and result.get("artifacts"):
+        result = {**result, "artifacts": {
+            name: {**ref, "url": f"/tasks/{task['task_id']}/artifacts/{name}"}
+            for name, ref in result["artifacts"].items()
+        }}
+    return result
+
+def describe_task(task, fields=("status", "result", "coalesced_with", "reused_from", "queue_position")):
+    """Client view of a Task, limited to `fields` (see TASK_VIEW_FIELDS). Empty links are left out."""
+    data = {"task_id": task["task_id"]}
+    for field in fields:
+        if field == "result":
+            data["result"] = task_result(task)
+        elif field == "queue_position":
+            if task["status"] == "QUEUED":
+                data["queue_position"] = SCHEDULER.position(task["coalesced_with"] or task["task_id"])
+        elif field in ("coalesced_with", "reused_from"):
+            if task[field]:
+                data[field] = task[field]
+        else:
+            data[field] = task[field]
+    return data
 
-def background_task_runner(task_id, prompt):
-    """Run agent in background thread."""
+def set_task_status(task_ids, status, result=None, **fields):
+    """Update task status (and result) and notify waiting clients."""
+    fields["status"] = status
+    if result is not None:
+        fields["result"] = stored_result(result)
+    for target_id in task_ids:
+        EVENTS.publish(target_id, "status", {"status": status}, fields)
+
+def publish_log(task_id, msg):
+    for target_id in [task_id] + COALESCER.followers(task_id):
+        EVENTS.publish(target_id, "log", {"message": msg})
+
+def background_task_runner(task_id, prompt, options=None):
+    """Run agent on a scheduler worker thread."""
     print(f"[SERVER]: Starting Task {task_id} in background...")
+    set_task_status([task_id] + COALESCER.followers(task_id), "Running", started_at=time.time())
     try:
-        # Call actual Agent
-        result = process_task(prompt)
-        
-        # Update result
-        TASKS[task_id]["status"] = result["status"] # COMPLETED or FAILED or ERROR
-        TASKS[task_id]["result"] = result
+        # Call actual Agent, forwarding every log line to subscribers
+        result = process_task(prompt, on_log=lambda msg: publish_log(task_id, msg), options=options)
+        result = ARTIFACTS.externalize_result(result)
         print(f"[SERVER]: Task {task_id} completed with status {result['status']}")
-        
     except Exception as e:
-        TASKS[task_id]["status"] = "FAILED"
-        TASKS[task_id]["result"] = {"error": str(e)}
+        result = {"error": str(e)}
         print(f"[SERVER]: Task {task_id} failed: {e}")
 
-@app.route('/tasks', methods=['POST'])
-def submit_task(): 
-    
-    """Endpoint to receive and process new Task."""
+    # Close the in-flight run first, so no follower can attach after the final status is sent
+    key = STORE.get(task_id)["coalesce_key"]
+    followers = []
+    if key:
+        followers = COALESCER.complete(key, task_id, stored_result(result), reusable=result.get("status") == "COMPLETED")
+
+    # Update result (followers get the same outcome)
+    set_task_status([task_id] + followers, result.get("status", "FAILED"), result) # COMPLETED or FAILED or ERROR
+    TASKS_FINISHED.inc(status=result.get("status", "FAILED"))
+    TASK_SECONDS.observe(time.time() - (STORE.get(task_id)["created_at"] or time.time()))
+
+if EXECUTION_MODE == "external":
+    # Workers claim QUEUED tasks straight from the store; this process only admits and serves them
+    SCHEDULER = StoreTaskQueue(STORE, max_queue_size=MAX_QUEUE_SIZE)
+elif EXECUTION_MODE == "inline":
+    # Fixed-size worker pool + bounded priority queue (replaces one thread per request)
+    SCHEDULER = TaskScheduler(background_task_runner, num_workers=MAX_WORKERS, max_queue_size=MAX_QUEUE_SIZE)
+else:
+    raise ValueError(f"Unknown A2A_EXECUTION_MODE '{EXECUTION_MODE}' (expected 'inline' or 'external')")
+
+def recover_tasks():
+    """
+    Pick up tasks that were QUEUED or Running when the server stopped (crash or restart).
+    Inline mode re-queues them. In external mode workers own them through leases,
+    so only the coalescing state (kept in memory) is rebuilt.
+    """
+    tasks = STORE.unfinished()
+    for task in tasks:
+        task_id = task["task_id"]
+        # Identical unfinished tasks share one run again (oldest first, so the old primary stays primary)
+        primary_id = COALESCER.attach_or_register(task["coalesce_key"], task_id) if task["coalesce_key"] else None
+        if primary_id:
+            set_task_status([task_id], STORE.status(primary_id), coalesced_with=primary_id)
+        elif EXECUTION_MODE == "inline":
+            set_task_status([task_id], "QUEUED", coalesced_with=None, started_at=None)
+            SCHEDULER.submit(task_id, task["priority"], task["prompt"], task["options"] or {}, force=True)
+        elif task["coalesced_with"]:
+            # Its primary is gone: let a worker run it
+            set_task_status([task_id], "QUEUED", coalesced_with=None)
+    if tasks:
+        print(f"[SERVER]: Recovered {len(tasks)} unfinished task(s) from the task store.")
+
+def mirror_logs(task_id, followers, after_id):
+    """Copy the log events of run `task_id` written after `after_id` to its followers. Returns the new cursor."""
+    # The store returns the events page by page
+    while True:
+        events = STORE.events(task_id, after_id)
+        if not events:
+            return after_id
+        for event in events:
+            after_id = event["id"]
+            if event["type"] == "log":
+                for follower_id in followers:
+                    EVENTS.publish(follower_id, "log", event["data"])
+
+def follow_external_runs():
+    """External mode: mirror the progress (status and log lines) of runs done by a2a_worker.py to their coalesced followers."""
+    last_status = {}
+    log_cursor = {}  # primary task_id -> id of its last event mirrored to followers
+    while True:
+        time.sleep(EXTERNAL_FOLLOW_INTERVAL)
+        try:
+            in_flight = COALESCER.in_flight()
+            for key, task_id in in_flight:
+                task = STORE.get(task_id)
+                if task is None:
+                    set_task_status(COALESCER.abandon(key, task_id), "FAILED", {"error": "Task was removed from the task store."})
+                elif task["status"] in TERMINAL_STATUSES:
+                    followers = COALESCER.complete(key, task_id, task["result"], reusable=task["status"] == "COMPLETED")
+                    # Remaining log lines go out before the final status
+                    mirror_logs(task_id, followers, log_cursor.get(task_id, 0))
+                    set_task_status(followers, task["status"], task["result"])
+                else:
+                    followers = COALESCER.followers(task_id)
+                    if task["status"] != last_status.get(task_id):
+                        set_task_status(followers, task["status"])
+                        last_status[task_id] = task["status"]
+                    if followers:
+                        log_cursor[task_id] = mirror_logs(task_id, followers, log_cursor.get(task_id, 0))
+            # Forget runs that are no longer in flight
+            active = {task_id for _, task_id in in_flight}
+            last_status = {k: v for k, v in last_status.items() if k in active}
+            log_cursor = {k: v for k, v in log_cursor.items() if k in active}
+        except Exception as e:
+            print(f"[SERVER]: Following external runs failed: {e}")
+
+def evict_expired_tasks():
+    """Background janitor: drop finished tasks older than A2A_TASK_TTL so the store stays bounded."""
+    while True:
+        time.sleep(TASK_EVICT_INTERVAL)
+        try:
+            removed = STORE.evict_finished(TASK_TTL_SECONDS)
+            blobs = ARTIFACTS.evict(TASK_TTL_SECONDS)
+            if removed or blobs:
+                print(f"[SERVER]: Evicted {removed} finished task(s) and {blobs} artifact(s) older than {TASK_TTL_SECONDS}s.")
+        except Exception as e:
+            print(f"[SERVER]: Task eviction failed: {e}")
+
+def validate_task_request(task_request):
+    """Error message for a malformed submission payload, or None. Checked before anything is stored."""
+    if not isinstance(task_request, dict):
+        return "Task payload must be a JSON object"
+    prompt = task_request.get("prompt")
+    if not prompt or not isinstance(prompt, str):
+        return "Prompt is required"
+    client_metadata = task_request.get("client_metadata")
+    if client_metadata is not None and not isinstance(client_metadata, dict):
+        return "client_metadata must be an object"
+    priority = (client_metadata or {}).get("priority")
+    if priority is not None and (isinstance(priority, bool) or not isinstance(priority, (str, int))):
+        return "client_metadata.priority must be a string or an integer"
+    options = task_request.get("options")
+    if options is not None and not isinstance(options, dict):
+        return "options must be an object"
+    if (options or {}).get("execution_timeouts") is not None:
+        try:
+            clamp_execution_timeouts(options["execution_timeouts"])
+        except ValueError as e:
+            return str(e)
+    return None
+
+def create_task(task_request):
+    """Create and queue one Task from a submission payload. Returns (response data, HTTP status code)."""
     
+    error = validate_task_request(task_request)
+    if error:
+        return {"error": error}, 400
+
     task_id = str(uuid.uuid4())
-    task_request = request.json
-    user_prompt = task_request.get("prompt", "")
-    
-    if not user_prompt:
-        return jsonify({"error": "Prompt is required"}), 400
+    user_prompt = task_request["prompt"]
+    client_metadata = task_request.get("client_metadata") or {}
+    priority = parse_priority(client_metadata.get("priority"))
+    # Per-task agent settings, e.g. {"execution_timeouts": {"window_timeout": 3}}
+    options = task_request.get("options") or {}
+    if options.get("execution_timeouts") is not None:
+        # Capped at the server maximums before the options are stored or used as a coalescing key
+        options = {**options, "execution_timeouts": clamp_execution_timeouts(options["execution_timeouts"])}
+    # Opt out of sharing: {"options": {"reuse": false}} (or no_cache) always starts a fresh run
+    reuse = options.get("reuse", True) and not options.get("no_cache")
+    key = coalesce_key(user_prompt, options)
 
     print(f"\n[SERVER]: Received Task ID: {task_id}")
     print(f"[SERVER]: Request: {user_prompt}")
     
     # Initialize Task status
-    TASKS[task_id] = {
-        "status": "Running",
-        "result": None,
+    task = {
+        "status": "QUEUED",
         "created_at": time.time(),
-        "prompt": user_prompt
+        "prompt": user_prompt,
+        "priority": priority,
+        "options": options
     }
-    
-    # Run background thread
-    thread = threading.Thread(target=background_task_runner, args=(task_id, user_prompt))
-    thread.start()
+
+    if reuse:
+        # 1. Same request finished recently -> answer right away
+        recent = COALESCER.recent_result(key)
+        if recent:
+            source_id, result = recent
+            task.update({"status": result["status"], "result": result, "reused_from": source_id})
+            STORE.create(task_id, task, ("status", {"status": result["status"]}))
+            print(f"[SERVER]: Task {task_id} served from recent result of Task {source_id}")
+            return {
+                "task_id": task_id,
+                "status": result["status"],
+                "reused_from": source_id,
+                "message": "Identical task finished recently, result reused."
+            }, 201
+
+        # 2. Same request already queued/running -> share its run.
+        # Attach before the row is written: a follower is stored with coalesced_with already set,
+        # so an external worker never sees it as a runnable QUEUED task.
+        task["coalesce_key"] = key
+        primary_id = COALESCER.attach_or_register(key, task_id)
+        if primary_id:
+            primary_status = STORE.status(primary_id) or "QUEUED"
+            task.update({"status": primary_status, "coalesced_with": primary_id})
+            STORE.create(task_id, task, ("status", {"status": primary_status}))
+            # The primary may have moved on, finished or been rejected (and notified its followers) before our row existed
+            primary, follower = STORE.get(primary_id), STORE.get(task_id)
+            if primary is None and task_id not in COALESCER.followers(primary_id):
+                set_task_status([task_id], "FAILED", {"error": "Task queue is full, the shared run was rejected"})
+            elif primary and follower["result"] is None and primary["status"] != follower["status"]:
+                set_task_status([task_id], primary["status"], primary["result"])
+            print(f"[SERVER]: Task {task_id} attached to in-flight Task {primary_id}")
+            response_data = {
+                "task_id": task_id,
+                "status": primary_status,
+                "coalesced_with": primary_id,
+                "message": "Identical task already in progress, sharing its result."
+            }
+            if primary_status == "QUEUED":
+                response_data["queue_position"] = SCHEDULER.position(primary_id)
+            return response_data, 202
+
+    def reject(e):
+        # Followers that attached in the meantime cannot be served either
+        followers = COALESCER.abandon(key, task_id) if reuse else []
+        set_task_status(followers, "FAILED", {"error": str(e)})
+        print(f"[SERVER]: Queue full, rejected Task {task_id}")
+        return {"error": str(e), "retry_after": e.retry_after}, 429
+
+    # Check the bound before the row exists: once stored, an external worker may claim it right away
+    try:
+        SCHEDULER.admit()
+    except QueueFullError as e:
+        return reject(e)
+    STORE.create(task_id, task, ("status", {"status": "QUEUED"}))
+
+    # Hand over to worker pool (inline mode re-checks the bound under its own lock)
+    try:
+        queue_position = SCHEDULER.submit(task_id, priority, user_prompt, options)
+    except QueueFullError as e:
+        # Only the in-process scheduler raises here, and no other process can have picked the task up
+        STORE.delete(task_id)
+        return reject(e)
     
     response_data = {
         "task_id": task_id,
-        "status": "SUBMITTED",
-        "message": "Task is being processed in background."
+        "status": "QUEUED",
+        "queue_position": queue_position,
+        "message": "Task is queued for processing in background."
     }
 
-    return jsonify(response_data), 202
+    return response_data, 202
+
+@app.route('/tasks', methods=['POST'])
+def submit_task(): 
+    
+    """Endpoint to receive and process new Task."""
+    
+    response_data, status_code = create_task(request.json or {})
+    response = jsonify(response_data)
+    if status_code == 429:
+        response.headers["Retry-After"] = str(response_data["retry_after"])
+    return response, status_code
+
+@app.route('/tasks:batch', methods=['POST'])
+def submit_task_batch():
+    """
+    Submit many Tasks in one round trip: {"tasks": [<task payload>, ...]}.
+    Every item gets its own outcome (same body as POST /tasks plus "status_code"), in request order.
+    Items rejected because the queue is full have status_code 429 and can be resubmitted later.
+    """
+    body = request.json or {}
+    payloads = body.get("tasks") if isinstance(body, dict) else body
+    if not isinstance(payloads, list) or not payloads:
+        return jsonify({"error": "A non-empty list of tasks is required"}), 400
+    if len(payloads) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} tasks per batch"}), 413
+
+    outcomes = []
+    for payload in payloads:
+        response_data, status_code = create_task(payload)
+        outcomes.append({**response_data, "status_code": status_code})
+    response = jsonify({"tasks": outcomes})
+    retry_after = [o["retry_after"] for o in outcomes if o["status_code"] == 429]
+    if retry_after:
+        response.headers["Retry-After"] = str(max(retry_after))
+    return response, 200
+
+@app.route('/tasks', methods=['GET'])
+def get_task_statuses():
+    """
+    Bulk status query: GET /tasks?ids=<id>,<id>,...&fields=status,queue_position
+    Returns only the requested fields of each Task (default: status), in the order of `ids`.
+    """
+    task_ids = [i for i in request.args.get("ids", "").split(",") if i]
+    fields = [f for f in request.args.get("fields", "status").split(",") if f]
+    unknown = [f for f in fields if f not in TASK_VIEW_FIELDS]
+    if not task_ids:
+        return jsonify({"error": "ids is required"}), 400
+    if unknown:
+        return jsonify({"error": f"Unknown field(s): {', '.join(unknown)}", "fields": list(TASK_VIEW_FIELDS)}), 400
+    if len(task_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} ids per query"}), 413
+
+    # Only the needed columns are read, so a status query never loads code or logs
+    columns = {"status", "coalesced_with", "reused_from"} | ({"result"} if "result" in fields else set())
+    columns |= {f for f in fields if f in TASK_FIELDS}
+    tasks = STORE.get_many(task_ids, columns)
+    response = jsonify({"tasks": [
+        describe_task(tasks[task_id], fields) if task_id in tasks else {"task_id": task_id, "error": "Task not found"}
+        for task_id in task_ids
+    ]})
+    return conditional_response(response)
+
+def conditional_response(response):
+    """ETag from the body: a client polling with If-None-Match gets 304 (no body) while nothing changed."""
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 @app.route('/tasks/<task_id>', methods=['GET'])
 def get_task_status(task_id):
-    """Check task status."""
-    task = TASKS.get(task_id)
+    """
+    Check task status.
+    Long-poll: with ?wait=<seconds> the request blocks until the status changes
+    (or the task finishes) before answering. Pass ?status=<last seen status> to
+    get an immediate answer if the status already moved on since the last poll.
+    """
+    cursor = EVENTS.last_id(task_id)  # taken before reading status so no transition is missed
+    task = STORE.get(task_id)
     if not task:
         return jsonify({"error": "Task not found"}), 404
-        
-    return jsonify({
-        "task_id": task_id,
-        "status": task["status"],
-        "result": task["result"]
-    })
+
+    wait = min(request.args.get("wait", 0, type=float), MAX_LONG_POLL_SECONDS)
+    known_status = request.args.get("status", task["status"])
+    busy = False
+    if wait > 0 and known_status == task["status"] and task["status"] not in TERMINAL_STATUSES:
+        if acquire_wait_slot("long_poll"):
+            try:
+                deadline = time.time() + wait
+                while time.time() < deadline:
+                    events = EVENTS.wait_for(task_id, cursor, deadline - time.time())
+                    if not events or any(e["type"] == "status" for e in events):
+                        break
+                    cursor = events[-1]["id"]
+            finally:
+                release_wait_slot("long_poll")
+            task = STORE.get(task_id) or task
+        else:
+            # Too many waiting requests: answer now, the client retries after Retry-After
+            busy = True
+
+    response = conditional_response(jsonify(describe_task(task)))
+    if busy:
+        response.headers["Retry-After"] = str(BUSY_RETRY_SECONDS)
+    return response
+
+@app.route('/tasks/<task_id>/artifacts/<name>', methods=['GET'])
+def get_task_artifact(task_id, name):
+    """
+    Download a Task artifact (game.py, screenshot.png, logs.txt, trace.json).
+    Content-addressed, so the ETag is the SHA-256 of the content: If-None-Match -> 304,
+    Range -> 206 Partial Content, and text artifacts are sent gzipped to clients that accept it.
+    """
+    task = STORE.get_many([task_id], {"result"}).get(task_id)
+    if not task:
+        return jsonify({"error": "Task not found"}), 404
+    ref = ((task["result"] or {}).get("artifacts") or {}).get(name)
+    if not ref:
+        return jsonify({"error": "Artifact not found"}), 404
+
+    digest = ref["sha256"]
+    compressed = ("gzip" in request.accept_encodings and "Range" not in request.headers
+                  and ARTIFACTS.has_gzip(digest))
+    path = ARTIFACTS.path(digest, compressed)
+    if not os.path.exists(path):
+        return jsonify({"error": "Artifact content is no longer available"}), 410
+    response = send_file(
+        path,
+        mimetype=ref["content_type"],
+        download_name=name,
+        etag=digest + ("-gzip" if compressed else ""),
+        conditional=True,
+        max_age=ARTIFACT_MAX_AGE
+    )
+    if compressed:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+@app.route('/tasks/<task_id>/events', methods=['GET'])
+def stream_task_events(task_id):
+    """
+    Server-Sent Events stream of status transitions and agent log lines.
+    Supports resuming with the Last-Event-ID header. Stream ends when the task finishes.
+    """
+    if STORE.status(task_id) is None:
+        return jsonify({"error": "Task not found"}), 404
+
+    if not acquire_wait_slot("sse"):
+        response = jsonify({"error": "Too many waiting requests, use long-polling (GET /tasks/<id>?wait=...)"})
+        response.headers["Retry-After"] = str(BUSY_RETRY_SECONDS)
+        return response, 503
+
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("after", 0))
+    try:
+        cursor = int(last_event_id)
+    except ValueError:
+        cursor = 0
+
+    def generate():
+        nonlocal cursor
+        while True:
+            # Reads the event log from the store page by page, so long logs are never held in memory
+            events = EVENTS.wait_for(task_id, cursor, SSE_HEARTBEAT_SECONDS)
+            if not events:
+                if EVENTS.is_closed(task_id):
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                cursor = event["id"]
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Runs when the stream ends or the client disconnects
+    response.call_on_close(lambda: release_wait_slot("sse"))
+    return response
+
+# --- 3. METRICS (Prometheus text format) ---
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Queue depth, workers, task counts and LLM load (read at scrape time), plus step / LLM latency histograms."""
+    queue = SCHEDULER.stats()
+    llm = LLM.stats()
+    gauges = (
+        render_gauges("a2a_queue_depth", "Tasks waiting for a worker.", queue["queued"])
+        + render_gauges("a2a_active_workers", "Workers running a task.", queue["active_workers"])
+        + render_gauges("a2a_workers", "Worker pool size (external mode: workers holding a live lease).", queue["num_workers"])
+        + render_gauges("a2a_tasks", "Tasks in the task store by status.", STORE.counts(), labelname="status")
+        + render_gauges("a2a_waiting_requests", "Open SSE streams and long-polls holding an HTTP thread.", dict(waiting_requests), labelname="kind")
+        + render_gauges("a2a_llm_in_flight", "LLM calls in progress in this process.", llm["in_flight"])
+    )
+    return Response(render_metrics(gauges), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
+    # Pick up work that was accepted before a crash/restart, then keep the store bounded
+    recover_tasks()
+    threading.Thread(target=evict_expired_tasks, name="task-store-janitor", daemon=True).start()
+    if EXECUTION_MODE == "external":
+        threading.Thread(target=follow_external_runs, name="external-run-follower", daemon=True).start()
+        print("[SERVER]: External execution mode: start workers with `python a2a_worker.py` on this host.")
+        if not os.getenv("A2A_ARTIFACT_DIR"):
+            print(f"[SERVER]: Warning: A2A_ARTIFACT_DIR is not set. Workers must write artifacts to the same "
+                  f"directory as this server ({ARTIFACTS.root}), so set it explicitly for server and workers.")
+    else:
+        # Pre-start headless displays and warm interpreters so the first executions don't pay for startup
+        display_pool = get_display_pool()
+        if display_pool:
+            display_pool.start()
+        zygote_pool = get_zygote_pool()
+        if zygote_pool:
+            zygote_pool.start()
     print(f"Starting A2A Server at http://127.0.0.1:{PORT}")
-    app.run(port=PORT)
+    try:
+        # Production WSGI server when available, Flask's development server otherwise
+        from waitress import serve
+        serve(app, port=PORT, threads=HTTP_THREADS)
+    except ImportError:
+        app.run(port=PORT, threaded=True)
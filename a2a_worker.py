@@ -0,0 +1,140 @@
+"""
+Out-of-process task worker.
+
+Run the server with A2A_EXECUTION_MODE=external, then start as many workers as
+needed on the same machine, with the same task database (A2A_TASK_DB) and
+artifact directory (A2A_ARTIFACT_DIR):
+
+    python a2a_worker.py [number_of_processes]
+
+Single host only: SQLite in WAL mode relies on shared memory and is not safe on
+a network filesystem, and artifacts are served from the server's local disk.
+
+Each worker claims the next QUEUED task from the store with a lease, renews the
+lease with heartbeats while the agent runs, and writes logs, status and result
+back to the store. If a worker dies, its lease expires and another worker takes
+the task over.
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+from colorama import Fore, Style, init
+
+from artifact_store import ARTIFACTS
+from execution_sandbox import DISPLAY_BASE, get_display_pool
+from execution_zygote import get_zygote_pool
+from game_maker_agent import process_task
+from task_store import create_task_store, stored_result
+
+init(autoreset=True)
+
+# --- CONFIGURATION ---
+# A task whose worker has not sent a heartbeat for this long is taken over by another worker
+WORKER_LEASE_SECONDS = float(os.getenv("A2A_WORKER_LEASE", "30"))
+HEARTBEAT_SECONDS = WORKER_LEASE_SECONDS / 3
+# Pause between claims when the queue is empty
+WORKER_POLL_SECONDS = float(os.getenv("A2A_WORKER_POLL", "1.0"))
+# Give up on a task after this many workers died while running it
+WORKER_MAX_ATTEMPTS = int(os.getenv("A2A_WORKER_MAX_ATTEMPTS", "3"))
+
+
+class TaskWorker:
+    """Claims tasks from a shared task store and runs them with `process_task`."""
+    def __init__(self, store, worker_id=None, lease_seconds=WORKER_LEASE_SECONDS):
+        self.store = store
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+
+    def _heartbeat(self, task_id, done, lost):
+        while not done.wait(HEARTBEAT_SECONDS):
+            if not self.store.renew_lease(task_id, self.worker_id, self.lease_seconds):
+                print(f"{Fore.RED}[WORKER {self.worker_id}]: Lost the lease on Task {task_id}.")
+                lost.set()
+                return
+
+    def run_one(self):
+        """Claim and run a single task. Returns False when the queue was empty."""
+        task = self.store.claim(self.worker_id, self.lease_seconds, WORKER_MAX_ATTEMPTS)
+        if task is None:
+            return False
+
+        task_id = task["task_id"]
+        print(f"{Fore.CYAN}[WORKER {self.worker_id}]: Starting Task {task_id} (attempt {task['attempts']})")
+        done, lost = threading.Event(), threading.Event()
+        threading.Thread(target=self._heartbeat, args=(task_id, done, lost), daemon=True).start()
+
+        def on_log(msg):
+            if not lost.is_set():
+                self.store.update(task_id, {}, ("log", {"message": msg}), owner=self.worker_id)
+
+        try:
+            result = process_task(task["prompt"], on_log=on_log, options=task["options"] or {})
+            result = ARTIFACTS.externalize_result(result)
+        except Exception as e:
+            result = {"error": str(e)}
+        finally:
+            done.set()
+
+        status = result.get("status", "FAILED")
+        written = self.store.update(
+            task_id,
+            {"status": status, "result": stored_result(result), "lease_expires_at": None},
+            ("status", {"status": status}),
+            owner=self.worker_id
+        )
+        if written is None:
+            print(f"{Fore.YELLOW}[WORKER {self.worker_id}]: Task {task_id} was taken over, result discarded.")
+        else:
+            print(f"{Fore.GREEN}[WORKER {self.worker_id}]: Task {task_id} completed with status {status}")
+        return True
+
+    def run_forever(self):
+        print(f"{Fore.GREEN}[WORKER {self.worker_id}]: Waiting for tasks in {getattr(self.store, 'path', 'memory')}")
+        while True:
+            try:
+                if not self.run_one():
+                    time.sleep(WORKER_POLL_SECONDS)
+            except Exception as e:
+                print(f"{Fore.RED}[WORKER {self.worker_id}]: {e}{Style.RESET_ALL}")
+                time.sleep(WORKER_POLL_SECONDS)
+
+
+def worker_display_pool(index=0):
+    """
+    Display pool of worker process `index` (None without Xvfb). A worker runs one task at a time,
+    so it gets A2A_DISPLAY_POOL_SIZE displays (default 1), numbered apart from its siblings.
+    Passed explicitly: execution_sandbox read its environment when it was imported.
+    """
+    size = int(os.getenv("A2A_DISPLAY_POOL_SIZE", "1"))
+    return get_display_pool(size=size, base=DISPLAY_BASE + index * size)
+
+
+def worker_main(index=0):
+    """One worker process: warm up the executor, then claim tasks until killed."""
+    if not os.getenv("A2A_ARTIFACT_DIR"):
+        print(f"{Fore.YELLOW}[WORKER]: Warning: A2A_ARTIFACT_DIR is not set, artifacts go to {ARTIFACTS.root}. "
+              f"The server must read them from the same directory.")
+    display_pool = worker_display_pool(index)
+    if display_pool:
+        display_pool.start()
+    zygote_pool = get_zygote_pool()
+    if zygote_pool:
+        zygote_pool.start()
+    TaskWorker(create_task_store()).run_forever()
+
+
+if __name__ == "__main__":
+    num_processes = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    if num_processes == 1:
+        worker_main()
+    else:
+        processes = [multiprocessing.Process(target=worker_main, args=(i,), name=f"a2a-worker-{i}") for i in range(num_processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
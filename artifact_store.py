@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# --- CONFIGURATION ---
+# Shared by the server and its workers (external mode: set it explicitly for both, on the same host)
+ARTIFACT_DIR = os.path.abspath(os.getenv("A2A_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "a2a_artifacts")))
+# Text artifacts at least this large also get a pre-compressed .gz copy served to gzip clients
+GZIP_MIN_BYTES = 512
+
+# Artifacts made from a task result: (name, content type)
+CODE_ARTIFACT = ("game.py", "text/x-python; charset=utf-8")
+LOGS_ARTIFACT = ("logs.txt", "text/plain; charset=utf-8")
+SCREENSHOT_ARTIFACT = ("screenshot.png", "image/png")
+TRACE_ARTIFACT = ("trace.json", "application/json")
+# Per-step diagnostics that grow with every step: kept in trace.json instead of every status response
+TRACE_FIELDS = ("trace", "execution_timings", "agent_history_tokens", "coder_iterations")
+# Content types that are compressible text
+TEXT_CONTENT_TYPES = ("text/", "application/json")
+
+
+class ArtifactStore:
+    """
+    Content-addressed blob store: every artifact is saved once under its SHA-256,
+    so identical code/screenshots produced by many tasks share one file.
+    Tasks refer to blobs by name: {"game.py": {"sha256", "size", "content_type"}}.
+    """
+    def __init__(self, root=ARTIFACT_DIR):
+        # Created by the first put(), not at import
+        self.root = root
+
+    def path(self, digest, compressed=False):
+        return os.path.join(self.root, digest[:2], digest + (".gz" if compressed else ""))
+
+    def put(self, data, content_type):
+        """Store bytes (no-op if already present). Returns the artifact reference."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            # Refresh the age of a shared blob, so evict() keeps it as long as its newest task
+            for blob in (path, self.path(digest, compressed=True)):
+                if os.path.exists(blob):
+                    os.utime(blob)
+        else:
+            self._write(path, data)
+            if content_type.startswith(TEXT_CONTENT_TYPES) and len(data) >= GZIP_MIN_BYTES:
+                self._write(self.path(digest, compressed=True), gzip.compress(data, mtime=0))
+        return {"sha256": digest, "size": len(data), "content_type": content_type}
+
+    def has_gzip(self, digest):
+        return os.path.exists(self.path(digest, compressed=True))
+
+    def evict(self, ttl):
+        """Delete blobs not written or reused for `ttl` seconds (same TTL as finished tasks). Returns the count."""
+        cutoff = time.time() - ttl
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    @staticmethod
+    def _write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file then rename, so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def externalize_result(self, result):
+        """
+        Move the heavy parts of a process_task result (code, logs, PNG screenshot, trace spans and
+        per-step timings) into the store. Returns a copy of the result with an "artifacts" map of references instead.
+        """
+        result = dict(result)
+        artifacts = dict(result.get("artifacts") or {})
+        code = result.pop("code", None)
+        if code:
+            name, content_type = CODE_ARTIFACT
+            artifacts[name] = self.put(code.encode("utf-8"), content_type)
+        logs = result.pop("logs", None)
+        if logs:
+            name, content_type = LOGS_ARTIFACT
+            artifacts[name] = self.put("\n".join(logs).encode("utf-8"), content_type)
+        screenshot = result.pop("screenshot", None)
+        if screenshot:
+            name, content_type = SCREENSHOT_ARTIFACT
+            artifacts[name] = self.put(screenshot, content_type)
+        trace = {field: result.pop(field) for field in TRACE_FIELDS if field in result}
+        if trace:
+            name, content_type = TRACE_ARTIFACT
+            artifacts[name] = self.put(json.dumps(trace, default=str).encode("utf-8"), content_type)
+        if artifacts:
+            result["artifacts"] = artifacts
+        return result
+
+
+ARTIFACTS = ArtifactStore()
@@ -0,0 +1,97 @@
+"""
+Benchmark: cold interpreter launch vs warm zygote fork.
+
+Each run executes a small "game" that imports the usual GUI libraries
+(and opens + paints a Tk window when a display is available), then exits.
+We measure wall time from launch request to process exit.
+
+Usage: python benchmark_execution.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from execution_zygote import ZygotePool, zygote_supported
+
+BENCH_GAME = """
+import os
+import random
+import tkinter as tk
+try:
+    import pygame
+except ImportError:
+    pass
+if os.environ.get("DISPLAY"):
+    root = tk.Tk()
+    canvas = tk.Canvas(root, width=200, height=200)
+    canvas.pack()
+    canvas.create_rectangle(10, 10, 50, 50, fill="red")
+    root.update()  # first frame painted
+    root.destroy()
+print("READY")
+"""
+
+
+def run_cold(script_path, workdir, env):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, script_path], cwd=workdir, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stdout, stderr = process.communicate()
+    elapsed = time.perf_counter() - started
+    if "READY" not in stdout:
+        raise RuntimeError(f"Cold run failed: {stderr}")
+    return elapsed
+
+
+def run_warm(pool, script_path, workdir, env):
+    stdout_path = os.path.join(workdir, "stdout.txt")
+    stderr_path = os.path.join(workdir, "stderr.txt")
+    started = time.perf_counter()
+    process = pool.spawn(script_path, workdir, env, stdout_path, stderr_path)
+    stdout, stderr = process.communicate(timeout=30)
+    elapsed = time.perf_counter() - started
+    if "READY" not in stdout:
+        raise RuntimeError(f"Warm run failed: {stderr}")
+    return elapsed
+
+
+def report(label, timings):
+    print(f"{label:<6} mean {statistics.mean(timings) * 1000:8.1f} ms | "
+          f"median {statistics.median(timings) * 1000:8.1f} ms | "
+          f"min {min(timings) * 1000:8.1f} ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    if not zygote_supported():
+        print("Zygote execution is not supported on this platform (Linux + fork required).")
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_exec_")
+    script_path = os.path.join(workdir, "game.py")
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(BENCH_GAME)
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+
+    pool = ZygotePool(size=1)
+    pool.start()  # zygote startup is paid once, at server start, so it is not timed
+
+    # One warm-up run each so file system caches are equally hot
+    run_cold(script_path, workdir, env)
+    run_warm(pool, script_path, workdir, env)
+
+    cold = [run_cold(script_path, workdir, env) for _ in range(runs)]
+    warm = [run_warm(pool, script_path, workdir, env) for _ in range(runs)]
+    pool.shutdown()
+
+    print(f"Launch-to-exit over {runs} runs (display: {os.environ.get('DISPLAY') or 'none'})")
+    report("cold", cold)
+    report("warm", warm)
+    print(f"Speedup (median): {statistics.median(cold) / statistics.median(warm):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
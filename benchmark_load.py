@@ -0,0 +1,133 @@
+"""
+Benchmark: end-to-end load test of the A2A server.
+
+Starts a2a_server.py in a subprocess with the stub LLM backend and the stub
+executor (no API key, no display needed), then drives it with N concurrent
+synthetic clients. Each client submits its tasks one after the other and
+waits for every result. Reports throughput and end-to-end latency
+percentiles, then the server's own step timings from GET /metrics.
+
+Every prompt is unique and sent with {"reuse": false, "no_cache": true},
+so each task runs the full workflow.
+
+Usage: python benchmark_load.py [clients] [tasks_per_client] [workers]
+Tune the stubs with A2A_STUB_LATENCY (seconds per LLM answer) and
+A2A_STUB_EXECUTION_SECONDS (seconds per execution).
+"""
+import asyncio
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from a2a_client import A2AClient
+
+SERVER_START_TIMEOUT = 30
+BENCH_OPTIONS = {"reuse": False, "no_cache": True}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def start_server(port, clients, workers, log_path):
+    env = dict(
+        os.environ,
+        A2A_PORT=str(port),
+        A2A_LLM_BACKEND="stub",
+        A2A_EXECUTOR="stub",
+        A2A_TASK_STORE="memory",
+        A2A_LLM_CACHE="0",
+        A2A_MAX_WORKERS=str(workers),
+        A2A_MAX_QUEUE_SIZE=str(max(20, clients)),
+        A2A_ZYGOTE="0",
+        A2A_HEADLESS="0",
+    )
+    with open(log_path, "w") as log:
+        server = subprocess.Popen([sys.executable, "a2a_server.py"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited on startup, see {log_path}")
+        try:
+            requests.get(f"{url}/.well-known/agent-card.json", timeout=1)
+            return server, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"Server did not start within {SERVER_START_TIMEOUT}s, see {log_path}")
+
+
+async def run_clients(url, clients, tasks_per_client):
+    """Returns one (latency seconds, status) per task."""
+    outcomes = []
+
+    async def synthetic_client(client, number):
+        for i in range(tasks_per_client):
+            started = time.perf_counter()
+            outcome = await client.run(f"Benchmark game #{number}-{i}: a snake game with a score.", options=BENCH_OPTIONS)
+            outcomes.append((time.perf_counter() - started, outcome["status"]))
+
+    async with A2AClient(url, max_connections=clients * 2) as client:
+        await asyncio.gather(*(synthetic_client(client, n) for n in range(clients)))
+    return outcomes
+
+
+def step_timings(metrics_text):
+    """{step: (count, total seconds)} from the a2a_step_seconds histogram."""
+    steps = {}
+    for series, step, value in re.findall(r'^a2a_step_seconds_(sum|count)\{step="([^"]+)"\} (\S+)$', metrics_text, re.M):
+        count, total = steps.get(step, (0, 0.0))
+        steps[step] = (float(value), total) if series == "count" else (count, float(value))
+    return steps
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    tasks_per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    log_path = os.path.join(tempfile.mkdtemp(prefix="bench_load_"), "server.log")
+    server, url = start_server(free_port(), clients, workers, log_path)
+    try:
+        started = time.perf_counter()
+        outcomes = asyncio.run(run_clients(url, clients, tasks_per_client))
+        elapsed = time.perf_counter() - started
+        metrics_text = requests.get(f"{url}/metrics", timeout=5).text
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    latencies = [seconds for seconds, status in outcomes if status == "COMPLETED"]
+    failed = len(outcomes) - len(latencies)
+    print(f"{clients} clients x {tasks_per_client} tasks, {workers} server workers "
+          f"(stub LLM {os.getenv('A2A_STUB_LATENCY', '0.2')}s, stub execution {os.getenv('A2A_STUB_EXECUTION_SECONDS', '0.5')}s)")
+    print(f"Completed {len(latencies)}/{len(outcomes)} tasks in {elapsed:.1f}s "
+          f"-> throughput {len(latencies) / elapsed:.2f} tasks/s, {failed} failed")
+    if latencies:
+        print(f"End-to-end latency: p50 {percentile(latencies, 50):.2f}s | p95 {percentile(latencies, 95):.2f}s | "
+              f"p99 {percentile(latencies, 99):.2f}s | max {max(latencies):.2f}s")
+    print("Server step timings (GET /metrics):")
+    for step, (count, total) in sorted(step_timings(metrics_text).items()):
+        print(f"  {step:<16} {int(count):6d} x  avg {total / count * 1000 if count else 0:8.1f} ms")
+    print(f"Server log: {log_path}")
+
+
+if __name__ == "__main__":
+    main()
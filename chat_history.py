@@ -0,0 +1,90 @@
+import re
+
+from PIL import Image
+
+# Rough token accounting (Gemini: ~4 characters per text token, fixed cost per image)
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+
+CODE_BLOCK_RE = re.compile(r"```python.*?```", re.DOTALL)
+CODE_PLACEHOLDER = "[earlier code version omitted: superseded by a newer version]"
+IMAGE_PLACEHOLDER = "[earlier screenshot omitted]"
+SUMMARY_PREFIX = "[Summary of earlier conversation]\n"
+MAX_SUMMARY_CHARS = 2000
+SUMMARY_LINE_CHARS = 160
+
+
+def estimate_part_tokens(part):
+    if isinstance(part, str):
+        return len(part) // CHARS_PER_TOKEN + 1
+    if isinstance(part, Image.Image):
+        return IMAGE_TOKENS
+    return 0
+
+
+def estimate_tokens(history):
+    """Approximate prompt size of a history: [{"role": ..., "parts": [...]}, ...]."""
+    return sum(estimate_part_tokens(part) for turn in history for part in turn["parts"])
+
+
+def _has_code(turn):
+    return any(isinstance(part, str) and CODE_BLOCK_RE.search(part) for part in turn["parts"])
+
+
+def _has_image(turn):
+    return any(isinstance(part, Image.Image) for part in turn["parts"])
+
+
+def _drop_superseded(history):
+    """Keep code and screenshots only in the most recent turn that has them."""
+    latest_code = max((i for i, turn in enumerate(history) if _has_code(turn)), default=None)
+    latest_image = max((i for i, turn in enumerate(history) if _has_image(turn)), default=None)
+    for i, turn in enumerate(history):
+        parts = []
+        for part in turn["parts"]:
+            if isinstance(part, str) and i != latest_code:
+                part = CODE_BLOCK_RE.sub(CODE_PLACEHOLDER, part)
+            elif isinstance(part, Image.Image) and i != latest_image:
+                part = IMAGE_PLACEHOLDER
+            parts.append(part)
+        turn["parts"] = parts
+
+
+def _summary_line(turn):
+    text = " ".join(part for part in turn["parts"] if isinstance(part, str))
+    text = " ".join(CODE_BLOCK_RE.sub("[code]", text).split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS] + "..."
+    return f"- {turn['role']}: {text}"
+
+
+def _add_to_summary(history, lines):
+    """Fold dropped turns into a summary part attached to the pinned first turn."""
+    first = history[0]
+    old = next((p for p in first["parts"] if isinstance(p, str) and p.startswith(SUMMARY_PREFIX)), None)
+    existing = old[len(SUMMARY_PREFIX):] if old else ""
+    text = "\n".join(filter(None, [existing] + lines))[-MAX_SUMMARY_CHARS:]
+    first["parts"] = [p for p in first["parts"] if p is not old] + [SUMMARY_PREFIX + text]
+
+
+def compact_history(history, token_budget):
+    """
+    Shrink a chat history in place until it fits `token_budget` (estimated tokens).
+    1. Superseded code versions and old screenshots are replaced by short placeholders.
+    2. If still too large, the oldest exchanges (after the first, pinned request) are
+       dropped and folded into a short summary attached to the first turn.
+    The last two turns are never dropped.
+    """
+    if estimate_tokens(history) <= token_budget:
+        return
+
+    _drop_superseded(history)
+
+    # Drop (model, user) pairs right after the pinned first turn to keep roles alternating
+    dropped_lines = []
+    while estimate_tokens(history) > token_budget and len(history) > 3:
+        dropped_lines.extend(_summary_line(turn) for turn in history[1:3])
+        del history[1:3]
+
+    if dropped_lines:
+        _add_to_summary(history, dropped_lines)
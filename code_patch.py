@@ -0,0 +1,111 @@
+import re
+
+# Edit formats the Coder may answer with once a first version of the code exists
+SEARCH_REPLACE_RE = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[^\n]*$", re.DOTALL | re.MULTILINE
+)
+DIFF_BLOCK_RE = re.compile(r"```(?:diff|patch)\s*\n(.*?)```", re.DOTALL)
+CODE_BLOCK_RE = re.compile(r"```python(.*?)```", re.DOTALL)
+HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+class PatchError(Exception):
+    """The Coder's edit does not apply cleanly to the current code."""
+
+
+def _line_matches(lines, needle):
+    """Start indexes of `needle` (list of lines) in `lines`, comparing without trailing whitespace."""
+    stripped = [line.rstrip() for line in lines]
+    target = [line.rstrip() for line in needle]
+    return [i for i in range(len(lines) - len(target) + 1) if stripped[i:i + len(target)] == target]
+
+
+def _find_lines(lines, needle, hint=0):
+    """Start index of the match of `needle` closest to `hint`, or None."""
+    matches = _line_matches(lines, needle) if needle else []
+    return min(matches, key=lambda i: abs(i - hint)) if matches else None
+
+
+def apply_search_replace(code, blocks):
+    """
+    Apply [(search, replace), ...]. Every SEARCH must match whole lines of the code exactly once
+    (trailing whitespace ignored), so `b = 1` never matches inside `bb = 1`.
+    """
+    for number, (search, replace) in enumerate(blocks, 1):
+        if not search.strip():
+            raise PatchError(f"SEARCH block {number} is empty")
+        lines = code.split("\n")
+        search_lines = search.rstrip("\n").split("\n")
+        matches = _line_matches(lines, search_lines)
+        if not matches:
+            raise PatchError(f"SEARCH block {number} was not found in the current code:\n{search.strip()[:200]}")
+        if len(matches) > 1:
+            raise PatchError(f"SEARCH block {number} matches {len(matches)} places, include more surrounding lines")
+        start = matches[0]
+        lines[start:start + len(search_lines)] = replace.rstrip("\n").split("\n") if replace.strip() else []
+        code = "\n".join(lines)
+    return code
+
+
+def apply_unified_diff(code, diff):
+    """Apply a unified diff. Hunks are located by their context lines (line numbers are only a hint)."""
+    lines = code.split("\n")
+    hunks = []
+    for line in diff.split("\n"):
+        header = HUNK_HEADER_RE.match(line)
+        if header:
+            hunks.append((int(header.group(1)), []))
+        elif hunks and not line.startswith(("---", "+++", "\\")):
+            hunks[-1][1].append(line)
+    if not hunks:
+        raise PatchError("the diff has no @@ hunks")
+
+    offset = 0
+    for number, (old_start, body) in enumerate(hunks, 1):
+        while body and not body[-1].strip():
+            body.pop()
+        # A blank line inside a hunk is an unchanged empty line whose leading space was lost
+        old = [l[1:] if l else "" for l in body if not l.startswith("+")]
+        new = [l[1:] if l else "" for l in body if not l.startswith("-")]
+        if not old:
+            raise PatchError(f"hunk {number} has no context lines to locate it")
+        start = _find_lines(lines, old, hint=old_start - 1 + offset)
+        if start is None:
+            raise PatchError(f"hunk {number} does not match the current code (near line {old_start})")
+        lines[start:start + len(old)] = new
+        offset = start - (old_start - 1) + len(new) - len(old)
+    return "\n".join(lines)
+
+
+def _compiles(code):
+    try:
+        compile(code, "<patched_game>", "exec")
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def apply_edit(code, response_text):
+    """
+    Apply the Coder's answer to `code`. Accepted formats, in order: SEARCH/REPLACE blocks,
+    a ```diff block, or a complete ```python block (the Coder chose to rewrite).
+    Returns (new_code, "search_replace" | "diff" | "full"). Raises PatchError if nothing applies.
+    """
+    blocks = SEARCH_REPLACE_RE.findall(response_text)
+    diff_match = DIFF_BLOCK_RE.search(response_text)
+    if blocks:
+        new_code, kind = apply_search_replace(code, blocks), "search_replace"
+    elif diff_match:
+        new_code, kind = apply_unified_diff(code, diff_match.group(1)), "diff"
+    else:
+        full = CODE_BLOCK_RE.search(response_text)
+        if not full:
+            raise PatchError("no SEARCH/REPLACE blocks, ```diff block or ```python block found")
+        return full.group(1).strip(), "full"
+
+    if new_code.strip() == code.strip():
+        raise PatchError("the edit does not change the code")
+    # A patch landing in the wrong place usually breaks the syntax of code that compiled before
+    if _compiles(code) and not _compiles(new_code):
+        raise PatchError("the patched code no longer compiles")
+    return new_code.strip(), kind
@@ -0,0 +1,84 @@
+import ast
+import importlib.util
+import sys
+
+# Calls that keep a GUI / game program running (attribute or function name)
+MAIN_LOOP_CALLS = {
+    "mainloop",      # tkinter / turtle
+    "wrapper",       # curses.wrapper(main)
+    "done",          # turtle.done()
+    "exitonclick",   # turtle
+    "run",           # pyglet.app.run(), app.run()
+    "run_game",      # arcade
+    "exec",          # PyQt6 / PySide6: app.exec()
+    "exec_",         # PyQt5 / PySide2: app.exec_()
+}
+
+
+def _imported_modules(tree):
+    """
+    Top-level names of every absolute import in the program.
+    Imports inside try/except are skipped: they are usually optional with a fallback.
+    """
+    modules = set()
+    def visit(node):
+        if isinstance(node, ast.Try):
+            return
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                modules.add(alias.name.split(".")[0])
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split(".")[0])
+        for child in ast.iter_child_nodes(node):
+            visit(child)
+    visit(tree)
+    return modules
+
+
+def _module_available(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _has_main_loop(tree):
+    """Detect a GUI main loop call or a `while` game loop."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.While):
+            return True
+        if isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+            if name in MAIN_LOOP_CALLS:
+                return True
+    return False
+
+
+def validate_code(code_content):
+    """
+    Fast, in-process checks before spending a subprocess on the code:
+    syntax, importable modules and presence of a main/game loop.
+    Returns an error message for the Coder, or None if the code looks runnable.
+    """
+    try:
+        tree = ast.parse(code_content)
+        compile(tree, "<generated_game>", "exec")
+    except SyntaxError as e:
+        return f"SyntaxError at line {e.lineno}: {e.msg}\n{(e.text or '').rstrip()}"
+    except ValueError as e:
+        return f"Code cannot be compiled: {e}"
+
+    stdlib = getattr(sys, "stdlib_module_names", set())
+    missing = sorted(
+        name for name in _imported_modules(tree)
+        if name not in stdlib and name not in sys.builtin_module_names and not _module_available(name)
+    )
+    if missing:
+        return (f"ModuleNotFoundError: module(s) not installed in the execution environment: {', '.join(missing)}. "
+                "Use only the standard library (e.g. tkinter) or installed packages.")
+
+    if not _has_main_loop(tree):
+        return "The program has no main loop (e.g. window.mainloop() or a `while` game loop), so its window would close immediately."
+
+    return None
@@ -0,0 +1,323 @@
+import math
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import ImageChops, ImageGrab
+
+from execution_zygote import get_zygote_pool
+
+try:
+    import pyautogui  # Only usable when a real desktop is available
+except Exception:
+    pyautogui = None
+
+# --- CONFIGURATION ---
+# Every execution gets its own directory under this root
+WORKSPACE_ROOT = os.getenv("A2A_WORKSPACE_DIR", os.path.join(tempfile.gettempdir(), "a2a_workspace"))
+# Headless displays (Xvfb): how many, first display number and screen geometry
+DISPLAY_POOL_SIZE = int(os.getenv("A2A_DISPLAY_POOL_SIZE", os.getenv("A2A_MAX_WORKERS", "2")))
+DISPLAY_BASE = int(os.getenv("A2A_DISPLAY_BASE", "100"))
+DISPLAY_SCREEN = os.getenv("A2A_DISPLAY_SCREEN", "1280x800x24")
+# Socket and lock file an X server creates for its display number
+X_SOCKET_PATH = "/tmp/.X11-unix/X{}"
+X_LOCK_PATH = "/tmp/.X{}-lock"
+# Set A2A_HEADLESS=0 to force the shared desktop even when Xvfb is installed
+HEADLESS_ENABLED = os.getenv("A2A_HEADLESS", "1") != "0"
+
+# Readiness-based timing (seconds) instead of fixed sleeps:
+# - window_timeout: max wait for the first frame to appear on screen
+# - settle_timeout: max wait for a frame to stop changing (animated games never do)
+# - gameplay_timeout: max wait for the game to react after the start keys
+# - poll_interval: delay between two frame checks
+EXECUTION_TIMEOUTS = {
+    "window_timeout": float(os.getenv("A2A_WINDOW_TIMEOUT", "5")),
+    "settle_timeout": float(os.getenv("A2A_SETTLE_TIMEOUT", "1.0")),
+    "gameplay_timeout": float(os.getenv("A2A_GAMEPLAY_TIMEOUT", "2")),
+    "poll_interval": float(os.getenv("A2A_FRAME_POLL_INTERVAL", "0.1")),
+}
+# Upper bounds of per-task overrides (options.execution_timeouts): an execution holds a worker and a display
+MAX_EXECUTION_TIMEOUTS = {
+    "window_timeout": 30.0,
+    "settle_timeout": 10.0,
+    "gameplay_timeout": 30.0,
+    "poll_interval": 1.0,
+}
+
+
+def clamp_execution_timeouts(overrides):
+    """
+    Checked per-task override of EXECUTION_TIMEOUTS: known keys with positive numbers,
+    capped at MAX_EXECUTION_TIMEOUTS. Raises ValueError (message meant for the client) otherwise.
+    """
+    if not isinstance(overrides, dict):
+        raise ValueError("options.execution_timeouts must be an object")
+    clamped = {}
+    for name, value in overrides.items():
+        if name not in MAX_EXECUTION_TIMEOUTS:
+            raise ValueError(f"Unknown execution timeout {name!r}, expected one of {', '.join(MAX_EXECUTION_TIMEOUTS)}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+            raise ValueError(f"options.execution_timeouts.{name} must be a positive number of seconds")
+        clamped[name] = min(float(value), MAX_EXECUTION_TIMEOUTS[name])
+    return clamped
+
+# xdotool key names for "Enter/Space to start game"
+XDOTOOL_KEYS = {"space": "space", "enter": "Return"}
+
+
+def frames_differ(a, b):
+    """True when two screenshots are not pixel-identical."""
+    if a is None or b is None or a.size != b.size:
+        return True
+    return ImageChops.difference(a.convert("RGB"), b.convert("RGB")).getbbox() is not None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Alive, owned by another user
+    return True
+
+
+def release_stale_display(number):
+    """
+    Make display :number usable after a crash or SIGKILL. Its socket and lock file are removed when the
+    X server named in the lock file is gone. Raises RuntimeError while that server is still running.
+    """
+    socket_path, lock_path = X_SOCKET_PATH.format(number), X_LOCK_PATH.format(number)
+    try:
+        with open(lock_path) as f:
+            pid = int(f.read().strip() or 0)
+    except FileNotFoundError:
+        pid = 0
+    except (OSError, ValueError):
+        pid = 0  # Unreadable lock: treated as stale, like Xvfb itself does
+    if pid and _pid_alive(pid):
+        raise RuntimeError(f"Display :{number} is already in use (X server pid {pid}), set A2A_DISPLAY_BASE")
+    for path in (socket_path, lock_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def headless_supported():
+    """Xvfb displays are only available on Linux with Xvfb installed."""
+    return HEADLESS_ENABLED and sys.platform.startswith("linux") and shutil.which("Xvfb") is not None
+
+
+class DisplayPool:
+    """
+    Pool of pre-started Xvfb virtual displays.
+    A display is lent to one execution at a time and returned afterwards.
+    """
+    def __init__(self, size=DISPLAY_POOL_SIZE, base=DISPLAY_BASE, screen=DISPLAY_SCREEN):
+        self.size = size
+        self.base = base
+        self.screen = screen
+        self._free = queue.Queue()
+        self._processes = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._processes:
+                return
+            for number in range(self.base, self.base + self.size):
+                display = f":{number}"
+                self._processes[display] = self._start_xvfb(number)
+                self._free.put(display)
+        print(f"[Sandbox]: Started {self.size} virtual displays ({', '.join(self._processes)}).")
+
+    def _start_xvfb(self, number):
+        # A socket already there would not tell us when ours is ready: it either belongs to a running
+        # X server (in use) or was left behind by a crashed one (removed)
+        release_stale_display(number)
+        socket_path = X_SOCKET_PATH.format(number)
+        process = subprocess.Popen(
+            ["Xvfb", f":{number}", "-screen", "0", self.screen, "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        # Xvfb is ready once its socket exists and the process is still running
+        deadline = time.time() + 10
+        while not os.path.exists(socket_path):
+            if process.poll() is not None or time.time() > deadline:
+                process.kill()
+                raise RuntimeError(f"Xvfb failed to start on display :{number}")
+            time.sleep(0.05)
+        if process.poll() is not None:
+            raise RuntimeError(f"Xvfb exited right after starting on display :{number}")
+        return process
+
+    def _ensure_alive(self, display):
+        # Restart a display whose Xvfb died while idle (its leftover socket and lock are cleaned up first)
+        process = self._processes[display]
+        if process.poll() is not None:
+            self._processes[display] = self._start_xvfb(int(display[1:]))
+
+    @contextmanager
+    def display(self, timeout=None):
+        """Borrow a display for the duration of the with-block."""
+        self.start()
+        display = self._free.get(timeout=timeout)
+        try:
+            with self._lock:
+                self._ensure_alive(display)
+            yield display
+        finally:
+            self._free.put(display)
+
+    def shutdown(self):
+        with self._lock:
+            for process in self._processes.values():
+                process.terminate()
+            self._processes.clear()
+
+
+_display_pool = None
+_display_pool_lock = threading.Lock()
+
+def get_display_pool(size=None, base=None):
+    """
+    Shared display pool, or None when running on a normal desktop.
+    `size` and `base` override A2A_DISPLAY_POOL_SIZE / A2A_DISPLAY_BASE; only the first call creates the pool.
+    """
+    global _display_pool
+    if not headless_supported():
+        return None
+    with _display_pool_lock:
+        if _display_pool is None:
+            _display_pool = DisplayPool(
+                DISPLAY_POOL_SIZE if size is None else size,
+                DISPLAY_BASE if base is None else base
+            )
+        return _display_pool
+
+
+class ExecutionSandbox:
+    """
+    Isolated environment for one code execution:
+    its own working directory and (when available) its own virtual display.
+    """
+    def __init__(self, display=None):
+        os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+        self.workdir = tempfile.mkdtemp(prefix="exec_", dir=WORKSPACE_ROOT)
+        self.display = display
+        self.code_path = os.path.join(self.workdir, "game.py")
+        self.stdout_path = os.path.join(self.workdir, "stdout.txt")
+        self.stderr_path = os.path.join(self.workdir, "stderr.txt")
+
+    @property
+    def env(self):
+        env = dict(os.environ)
+        if self.display:
+            env["DISPLAY"] = self.display
+        return env
+
+    def write_code(self, code_content):
+        with open(self.code_path, "w", encoding="utf-8") as f:
+            f.write(code_content)
+
+    def launch(self):
+        """
+        Start the game process. Forks from a warm zygote interpreter when possible,
+        otherwise starts a cold interpreter. Both return a Popen-like handle.
+        """
+        zygote_pool = get_zygote_pool()
+        if zygote_pool is not None:
+            try:
+                return zygote_pool.spawn(self.code_path, self.workdir, self.env, self.stdout_path, self.stderr_path)
+            except Exception as e:
+                print(f"[Sandbox]: Zygote unavailable ({e}), using cold start.")
+        # Use sys.executable to ensure current python environment is used
+        return subprocess.Popen(
+            [sys.executable, self.code_path],
+            cwd=self.workdir,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+
+    def press_keys(self, keys):
+        if self.display:
+            if shutil.which("xdotool"):
+                subprocess.run(
+                    ["xdotool", "key"] + [XDOTOOL_KEYS.get(k, k) for k in keys],
+                    env=self.env, capture_output=True, timeout=5
+                )
+        elif pyautogui is not None:
+            pyautogui.press(keys)
+
+    def screenshot(self):
+        """Capture only this sandbox's display (or the desktop when there is none)."""
+        if self.display:
+            return ImageGrab.grab(xdisplay=self.display)
+        if pyautogui is not None:
+            return pyautogui.screenshot()
+        return ImageGrab.grab()
+
+    def wait_for_frame(self, process, reference, timeout, settle_timeout, poll_interval, require_change=True):
+        """
+        Poll the screen instead of sleeping a fixed time.
+        With require_change, first wait until the frame differs from `reference`
+        (window mapped/painted), then until two consecutive frames are identical.
+        Returns (frame, outcome, first_change_seconds); outcome is one of
+        "stable", "animating" (still changing after settle_timeout), "timeout" or "exited".
+        """
+        started = time.time()
+        changed_at = None if require_change else started
+        previous = None
+        frame = reference
+        while True:
+            if process.poll() is not None:
+                return frame, "exited", None if changed_at is None else changed_at - started
+            frame = self.screenshot()
+            now = time.time()
+            if changed_at is None:
+                if frames_differ(frame, reference):
+                    changed_at = now
+            elif previous is not None and not frames_differ(frame, previous):
+                return frame, "stable", changed_at - started
+            elif now - changed_at >= settle_timeout:
+                return frame, "animating", changed_at - started
+            if now - started >= timeout:
+                return frame, "timeout", None if changed_at is None else changed_at - started
+            previous = frame
+            time.sleep(poll_interval)
+
+
+# Without virtual displays every game shares one screen, so executions take turns
+_desktop_lock = threading.Lock()
+
+@contextmanager
+def execution_sandbox():
+    """
+    Create a sandbox, borrowing a virtual display from the pool if possible.
+    Its working directory is deleted on exit: the caller has stopped the game process by then.
+    """
+    pool = get_display_pool()
+    if pool is None:
+        with _desktop_lock:
+            sandbox = ExecutionSandbox()
+            try:
+                yield sandbox
+            finally:
+                shutil.rmtree(sandbox.workdir, ignore_errors=True)
+        return
+    with pool.display() as display:
+        sandbox = ExecutionSandbox(display)
+        try:
+            yield sandbox
+        finally:
+            shutil.rmtree(sandbox.workdir, ignore_errors=True)
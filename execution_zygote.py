@@ -0,0 +1,326 @@
+"""
+Zygote-style execution pool.
+
+A zygote is a long-lived Python interpreter that has already imported the common
+GUI libraries (tkinter, pygame, ...). For every game run it forks a child that
+executes the generated code, so the child starts with a warm interpreter instead
+of paying for interpreter startup + heavy imports.
+
+Run as a script, this file is the zygote process itself. It talks to its parent
+with JSON lines: requests on stdin, "started"/"exit" events on stdout.
+"""
+import itertools
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+
+# Libraries imported once in the zygote and inherited by every forked child
+PRELOAD_MODULES = ["tkinter", "tkinter.ttk", "tkinter.messagebox", "turtle", "curses", "pygame", "random", "math"]
+
+ZYGOTE_ENABLED = os.getenv("A2A_ZYGOTE", "1") != "0"
+ZYGOTE_POOL_SIZE = int(os.getenv("A2A_ZYGOTE_POOL_SIZE", "1"))
+
+
+def zygote_supported():
+    """fork() after importing Tk is only safe on Linux (macOS frameworks are not fork-safe)."""
+    return ZYGOTE_ENABLED and sys.platform.startswith("linux") and hasattr(os, "fork")
+
+
+# --- CLIENT SIDE (used by the server process) ---
+
+class ZygoteProcess:
+    """Popen-like handle for a game process forked by a zygote."""
+    def __init__(self, zygote, pid, stdout_path, stderr_path):
+        self.zygote = zygote
+        self.pid = pid
+        self.returncode = None
+        self.stdout_path = stdout_path
+        self.stderr_path = stderr_path
+        self._exited = threading.Event()
+
+    def _set_exit(self, returncode):
+        self.returncode = returncode
+        self._exited.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(f"zygote child {self.pid}", timeout)
+        return self.returncode
+
+    def _signal(self, sig):
+        if self.returncode is None:
+            try:
+                # Child runs in its own session, so this also reaches its subprocesses
+                os.killpg(self.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def terminate(self):
+        self._signal(15)
+
+    def kill(self):
+        self._signal(9)
+
+    def communicate(self, timeout=None):
+        self.wait(timeout)
+        outputs = []
+        for path in (self.stdout_path, self.stderr_path):
+            try:
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    outputs.append(f.read())
+            except OSError:
+                outputs.append("")
+        return outputs[0], outputs[1]
+
+
+class ExecutionZygote:
+    """One warm zygote interpreter and the children it has forked."""
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}   # request id -> [threading.Event, ZygoteProcess or error]
+        self._children = {}  # pid -> ZygoteProcess
+
+    def start(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            self._process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                bufsize=1
+            )
+            ready = json.loads(self._process.stdout.readline() or "{}")
+            if not ready.get("ready"):
+                raise RuntimeError("Execution zygote failed to start")
+            threading.Thread(target=self._read_events, args=(self._process,), daemon=True).start()
+
+    def _read_events(self, process):
+        for line in process.stdout:
+            message = json.loads(line)
+            if message["event"] == "started":
+                slot = self._pending.pop(message["id"], None)
+                if slot:
+                    child = ZygoteProcess(self, message["pid"], *slot[2])
+                    self._children[child.pid] = child
+                    slot[1] = child
+                    slot[0].set()
+            elif message["event"] == "exit":
+                child = self._children.pop(message["pid"], None)
+                if child:
+                    child._set_exit(message["returncode"])
+            elif message["event"] == "error":
+                slot = self._pending.pop(message["id"], None)
+                if slot:
+                    slot[1] = RuntimeError(message["error"])
+                    slot[0].set()
+
+        # Zygote died: nobody will report these children any more
+        for child in list(self._children.values()):
+            child._set_exit(-1)
+        self._children.clear()
+        for slot in list(self._pending.values()):
+            slot[1] = RuntimeError("Execution zygote exited")
+            slot[0].set()
+        self._pending.clear()
+
+    def spawn(self, script_path, cwd, env, stdout_path, stderr_path, timeout=10):
+        """Fork a warm child running `script_path`. Returns a ZygoteProcess."""
+        self.start()
+        request_id = next(self._ids)
+        slot = [threading.Event(), None, (stdout_path, stderr_path)]
+        self._pending[request_id] = slot
+        request = {
+            "id": request_id, "path": script_path, "cwd": cwd, "env": env,
+            "stdout": stdout_path, "stderr": stderr_path
+        }
+        with self._lock:
+            self._process.stdin.write(json.dumps(request) + "\n")
+            self._process.stdin.flush()
+        if not slot[0].wait(timeout):
+            self._pending.pop(request_id, None)
+            raise RuntimeError("Execution zygote did not answer in time")
+        if isinstance(slot[1], Exception):
+            raise slot[1]
+        return slot[1]
+
+    def shutdown(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.stdin.close()
+                self._process.terminate()
+
+
+class ZygotePool:
+    """Round-robin over a few zygotes so one slow fork does not block every task."""
+    def __init__(self, size=ZYGOTE_POOL_SIZE):
+        self.zygotes = [ExecutionZygote() for _ in range(max(1, size))]
+        self._next = itertools.cycle(self.zygotes)
+        self._lock = threading.Lock()
+
+    def start(self):
+        for zygote in self.zygotes:
+            zygote.start()
+        print(f"[Zygote]: {len(self.zygotes)} warm interpreter(s) ready.")
+
+    def spawn(self, script_path, cwd, env, stdout_path, stderr_path):
+        with self._lock:
+            zygote = next(self._next)
+        return zygote.spawn(script_path, cwd, env, stdout_path, stderr_path)
+
+    def shutdown(self):
+        for zygote in self.zygotes:
+            zygote.shutdown()
+
+
+_zygote_pool = None
+_zygote_pool_lock = threading.Lock()
+
+def get_zygote_pool():
+    """Shared zygote pool, or None when forking is not supported on this platform."""
+    global _zygote_pool
+    if not zygote_supported():
+        return None
+    with _zygote_pool_lock:
+        if _zygote_pool is None:
+            _zygote_pool = ZygotePool()
+        return _zygote_pool
+
+
+# --- ZYGOTE SIDE (this file run as a script) ---
+
+def _run_child(request):
+    """Executed in the forked child: become the game process. Never returns."""
+    code = 1
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.setsid()
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        out_fd = os.open(request["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        err_fd = os.open(request["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(devnull, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+        import runpy
+        sys.argv = [request["path"]]
+        sys.path[0] = request["cwd"]
+        runpy.run_path(request["path"], run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        # Same semantics as the interpreter: None -> 0, int -> itself, other -> print + 1
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        # Hide the zygote's own frames so the traceback looks like a normal run
+        import traceback
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request["path"]:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def zygote_main():
+    # Keep the protocol channel private: anything printed during preloading goes to stderr
+    proto = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+    preloaded = []
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+            preloaded.append(name)
+        except Exception:
+            pass
+
+    def send(message):
+        proto.write(json.dumps(message) + "\n")
+
+    send({"ready": True, "preloaded": preloaded})
+
+    # SIGCHLD wakes up select() through this pipe, so exits are reported immediately
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    buffer = b""
+    stdin_fd = sys.stdin.fileno()
+    while True:
+        try:
+            readable, _, _ = select.select([stdin_fd, wakeup_r], [], [], 1.0)
+        except InterruptedError:
+            readable = []
+        if wakeup_r in readable:
+            try:
+                os.read(wakeup_r, 4096)
+            except BlockingIOError:
+                pass
+
+        # Report finished children
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            send({"event": "exit", "pid": pid, "returncode": os.waitstatus_to_exitcode(status)})
+
+        if stdin_fd not in readable:
+            continue
+        chunk = os.read(stdin_fd, 65536)
+        if not chunk:
+            break  # Parent went away
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            request = json.loads(line)
+            try:
+                proto.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+            except OSError as e:
+                send({"event": "error", "id": request["id"], "error": str(e)})
+                continue
+            if pid == 0:
+                proto.close()
+                os.close(wakeup_r)
+                os.close(wakeup_w)
+                _run_child(request)
+            send({"event": "started", "id": request["id"], "pid": pid})
+
+
+if __name__ == "__main__":
+    zygote_main()
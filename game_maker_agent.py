@@ -1,140 +1,286 @@
+import hashlib
 import os
 import re
 import time
 import json
 import subprocess
 import sys
-import threading
-import pyautogui
-from PIL import Image
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from PIL import Image, ImageDraw
 from colorama import Fore, Style
 from dotenv import load_dotenv
+from chat_history import compact_history, estimate_part_tokens, estimate_tokens
+from code_patch import PatchError, apply_edit
+from code_validator import validate_code
+from screenshot_pipeline import capture_window
+from tracing import Tracer
+from llm_cache import LLM_CACHE
+from llm_backend import LLM, new_call_stats
+from llm_stream import LLM_STREAMING_ENABLED, code_block_end, json_object_end
+from execution_sandbox import EXECUTION_TIMEOUTS, clamp_execution_timeouts, execution_sandbox
 
 # --- API CONFIGURATION ---
+# GOOGLE_API_KEY is read by the Gemini backend on its first call (llm_backend.py, A2A_LLM_BACKEND)
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-# Use model supporting both text and images
-MODEL_NAME = 'gemini-2.5-flash' 
 
 # --- SYSTEM SUPPORT FUNCTIONS (EXECUTION & SCREENSHOT) ---
-TEMP_CODE_FILE = "temp_game.py"
-TEMP_SCREENSHOT_FILE = "temp_screenshot.png"
+# Cost of one execution used for "seconds saved" reports before any run has been measured
+ESTIMATED_EXECUTION_SECONDS = 3.0
 
-def execute_and_capture_screenshot(code_content):
+def execute_and_capture_screenshot(code_content, timeouts=None):
     """
-    Save code to temp file, run it in a separate process,
-    wait a few seconds, capture screenshot, then kill process.
+    Save code into an isolated sandbox directory, run it in a separate process
+    (on the sandbox's own virtual display when available),
+    capture a screenshot as soon as the game frame is stable, then kill process.
+    Returns (execution_error, screenshot, timing): screenshot is an in-memory
+    screenshot_pipeline.Screenshot cropped to the game window (None on error),
+    timing reports how long each phase took and which timeouts were used.
     """
+    timeouts = {**EXECUTION_TIMEOUTS, **clamp_execution_timeouts(timeouts or {})}
+    timing = {"timeouts": timeouts}
+    started = time.time()
     print(f"{Fore.YELLOW}[System]: Preparing execution environment...{Style.RESET_ALL}")
     
-    # 1. Save code to file
-    with open(TEMP_CODE_FILE, "w", encoding="utf-8") as f:
-        f.write(code_content)
-    
-    execution_error = None
-    
-    # 2. Run code in subprocess
-    try:
-        # Use sys.executable to ensure current python environment is used
-        process = subprocess.Popen(
-            [sys.executable, TEMP_CODE_FILE],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+    with execution_sandbox() as sandbox:
+        # 1. Save code to file
+        sandbox.write_code(code_content)
+        where = f"display {sandbox.display}" if sandbox.display else "desktop"
         
-        print(f"{Fore.YELLOW}[System]: Code running. Waiting 1 second for interface load...{Style.RESET_ALL}")
-        time.sleep(1) 
+        execution_error = None
+        screenshot = None
         
-        # Force focus window (macOS fix)
-        if sys.platform == "darwin":
-            try:
-                # AppleScript to activate window of the process
-                cmd = f'tell application "System Events" to set frontmost of the first process whose unix id is {process.pid} to true'
-                subprocess.run(["osascript", "-e", cmd], capture_output=True)
-                print(f"{Fore.YELLOW}[System]: Sent Active Window command (macOS)...{Style.RESET_ALL}")
-                time.sleep(1) # Wait for window transition
-            except Exception as e:
-                print(f"{Fore.RED}[System]: Window focus error: {e}{Style.RESET_ALL}")
-
-        # Simulate key press to start game (if required)
-        print(f"{Fore.YELLOW}[System]: Sending Enter/Space to start game...{Style.RESET_ALL}")
+        # 2. Run code in subprocess
         try:
-            # Press both space and enter to cover common cases
-            pyautogui.press(['space', 'enter'])
-        except Exception:
-            pass
+            # Reference frame: what the screen looks like before the game window exists
+            blank_frame = sandbox.screenshot()
+
+            # Warm fork from the zygote pool when available, cold interpreter otherwise
+            process = sandbox.launch()
+            timing["launch_seconds"] = round(time.time() - started, 3)
             
-        print(f"{Fore.YELLOW}[System]: Waiting 2 seconds for gameplay...{Style.RESET_ALL}")
-        time.sleep(2)
-        
-        # Check if process crashed immediately
-        if process.poll() is not None:
-             stdout, stderr = process.communicate()
-             execution_error = f"Program crashed immediately on startup:\nStdout: {stdout}\nStderr: {stderr}"
-        else:
-            # 3. Capture FULL screenshot
-            screenshot = pyautogui.screenshot()
-            screenshot.save(TEMP_SCREENSHOT_FILE)
-            print(f"{Fore.YELLOW}[System]: Screenshot saved (Full Screen).{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}[System]: Code running on {where}. Waiting for interface to appear...{Style.RESET_ALL}")
+            frame, outcome, first_frame = sandbox.wait_for_frame(
+                process, blank_frame, timeouts["window_timeout"], timeouts["settle_timeout"], timeouts["poll_interval"]
+            )
+            timing["first_frame_seconds"] = None if first_frame is None else round(first_frame, 3)
+            timing["window_outcome"] = outcome
             
-            # 4. Kill process
-            process.terminate()
-            try:
-                process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                process.kill()
-            print(f"{Fore.YELLOW}[System]: Game program closed.{Style.RESET_ALL}")
+            # Force focus window (macOS fix)
+            if sys.platform == "darwin" and outcome != "exited":
+                try:
+                    # AppleScript to activate window of the process
+                    cmd = f'tell application "System Events" to set frontmost of the first process whose unix id is {process.pid} to true'
+                    subprocess.run(["osascript", "-e", cmd], capture_output=True)
+                    print(f"{Fore.YELLOW}[System]: Sent Active Window command (macOS)...{Style.RESET_ALL}")
+                except Exception as e:
+                    print(f"{Fore.RED}[System]: Window focus error: {e}{Style.RESET_ALL}")
 
-    except Exception as e:
-        execution_error = f"System error trying to run code: {str(e)}"
-        if 'process' in locals() and process.poll() is None:
-             process.kill()
+            if outcome != "exited":
+                # Simulate key press to start game (if required)
+                print(f"{Fore.YELLOW}[System]: Sending Enter/Space to start game...{Style.RESET_ALL}")
+                try:
+                    # Press both space and enter to cover common cases
+                    sandbox.press_keys(['space', 'enter'])
+                except Exception:
+                    pass
+                    
+                print(f"{Fore.YELLOW}[System]: Waiting for gameplay frame to settle...{Style.RESET_ALL}")
+                frame, outcome, _ = sandbox.wait_for_frame(
+                    process, frame, timeouts["gameplay_timeout"], timeouts["gameplay_timeout"],
+                    timeouts["poll_interval"], require_change=False
+                )
+                timing["gameplay_outcome"] = outcome
+            
+            # Check if process crashed on startup
+            if process.poll() is not None:
+                 stdout, stderr = process.communicate()
+                 execution_error = f"Program crashed immediately on startup:\nStdout: {stdout}\nStderr: {stderr}"
+            else:
+                # 3. Keep the last polled frame in memory, cropped to the game window
+                capture_started = time.time()
+                screenshot = capture_window(frame, blank_frame)
+                timing["capture_seconds"] = round(time.time() - capture_started, 3)
+                timing["screenshot"] = screenshot.describe()
+                print(f"{Fore.YELLOW}[System]: Screenshot captured ({where}).{Style.RESET_ALL}")
+                
+                # 4. Kill process
+                process.terminate()
+                try:
+                    process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                print(f"{Fore.YELLOW}[System]: Game program closed.{Style.RESET_ALL}")
 
-    return execution_error, TEMP_SCREENSHOT_FILE
+        except Exception as e:
+            execution_error = f"System error trying to run code: {str(e)}"
+            if 'process' in locals() and process.poll() is None:
+                 process.kill()
+
+    timing["total_seconds"] = round(time.time() - started, 3)
+    return execution_error, screenshot, timing
+
+# Stub executor: a fixed delay and a synthetic frame instead of a real process, for offline load tests
+STUB_EXECUTION_SECONDS = float(os.getenv("A2A_STUB_EXECUTION_SECONDS", "0.5"))
+
+def stub_execute_and_capture_screenshot(code_content, timeouts=None):
+    """
+    Same contract as execute_and_capture_screenshot, without running anything.
+    Code that does not compile "crashes"; otherwise the frame is drawn from the code's hash,
+    so the same code always gives the same screenshot.
+    """
+    started = time.time()
+    time.sleep(STUB_EXECUTION_SECONDS)
+    timing = {"timeouts": {**EXECUTION_TIMEOUTS, **clamp_execution_timeouts(timeouts or {})}, "launch_seconds": 0.0}
+    try:
+        compile(code_content, "game.py", "exec")
+    except (SyntaxError, ValueError) as e:
+        timing.update(window_outcome="exited", total_seconds=round(time.time() - started, 3))
+        return f"Program crashed immediately on startup:\nStdout: \nStderr: {e}", None, timing
+    seed = int(hashlib.sha256(code_content.encode("utf-8")).hexdigest()[:8], 16)
+    frame = Image.new("RGB", (640, 480), "black")
+    ImageDraw.Draw(frame).rectangle((seed % 300, seed % 200, seed % 300 + 200, seed % 200 + 150), fill="lime")
+    screenshot = capture_window(frame)
+    timing.update(first_frame_seconds=0.0, window_outcome="stable", capture_seconds=0.0,
+                  screenshot=screenshot.describe(), total_seconds=round(time.time() - started, 3))
+    return None, screenshot, timing
+
+# "sandbox" runs the code for real; "stub" is for benchmarks without a display (benchmark_load.py)
+EXECUTORS = {"sandbox": execute_and_capture_screenshot, "stub": stub_execute_and_capture_screenshot}
+EXECUTOR = os.getenv("A2A_EXECUTOR", "sandbox")
 
 # --- ENHANCED AGENT DEFINITIONS ---
+# Max estimated prompt size of one agent's chat history before older turns are compacted
+AGENT_HISTORY_TOKEN_BUDGET = int(os.getenv("A2A_AGENT_HISTORY_TOKENS", "12000"))
+
+def generate_cached(model, contents, use_cache=True, cache_stats=None, parse=None,
+                    stop_at=None, on_progress=None, llm_stats=None):
+    """
+    LLM.generate() (rate-limited, retried) behind the content-addressed response cache.
+    model: llm_backend.LLMModel from LLM.model().
+    parse: optional function applied to the text; a response that fails to parse is not cached.
+    cache_stats: optional dict counting this task's "hits" / "misses" / "bypassed".
+    stop_at / on_progress: see llm_stream.stream_generate (used when streaming is enabled).
+    llm_stats: optional per-task call accounting (llm_backend.new_call_stats()).
+    Returns the (parsed) response text.
+    """
+    key = None
+    if use_cache and LLM_CACHE.enabled:
+        key = LLM_CACHE.make_key(LLM.model_name, model.system_instruction, contents, model.generation_config)
+        text = LLM_CACHE.get(key)
+        if cache_stats is not None:
+            cache_stats["hits" if text is not None else "misses"] += 1
+        if text is not None:
+            return parse(text) if parse else text
+    elif cache_stats is not None:
+        cache_stats["bypassed"] += 1
+
+    text = LLM.generate(model, contents, stream=LLM_STREAMING_ENABLED, stop_at=stop_at,
+                        on_progress=on_progress, call_stats=llm_stats)
+    result = parse(text) if parse else text
+    if key:
+        LLM_CACHE.put(key, text)
+    return result
+
 class Agent:
-    def __init__(self, name, system_instruction):
+    """
+    One agent session for one task. The history is kept here (not in a ChatSession)
+    so it can be capped by a token budget and compacted before every call.
+    """
+    def __init__(self, name, system_instruction, token_budget=AGENT_HISTORY_TOKEN_BUDGET,
+                 use_cache=True, cache_stats=None, llm_stats=None, on_progress=None, tracer=None):
         self.name = name
-        self.model = genai.GenerativeModel(
-            MODEL_NAME, 
-            system_instruction=system_instruction
-        )
-        self.chat_session = self.model.start_chat(history=[])
+        self.system_instruction = system_instruction
+        self.model = LLM.model(name, system_instruction)
+        self.token_budget = token_budget
+        self.use_cache = use_cache
+        self.cache_stats = cache_stats
+        self.llm_stats = llm_stats
+        self.on_progress = on_progress  # function(agent_name, text_so_far) while an answer streams in
+        self.tracer = tracer
+        self.history = []
+        self.history_tokens = []  # estimated prompt size sent on each call
+
+    @property
+    def last_history_tokens(self):
+        return self.history_tokens[-1] if self.history_tokens else 0
 
-    def reply(self, content_parts):
+    def reply(self, content_parts, use_cache=None, stop_at=None):
         # content_parts can be a text string OR a list containing [text, image]
-        response = self.chat_session.send_message(content_parts)
-        return response.text
+        # use_cache: per-call override of the session's cache setting (False = always ask the model)
+        # stop_at: stop reading the streamed answer once this returns an end index (e.g. code_block_end)
+        parts = content_parts if isinstance(content_parts, list) else [content_parts]
+        self.history.append({"role": "user", "parts": parts})
+        compact_history(self.history, self.token_budget)
+        self.history_tokens.append(estimate_tokens(self.history))
+        span = self.tracer.span(f"agent.{self.name.lower()}", prompt_tokens=self.last_history_tokens) if self.tracer else nullcontext({})
+        try:
+            with span as attributes:
+                text = generate_cached(
+                    self.model, self.history,
+                    use_cache=self.use_cache if use_cache is None else use_cache,
+                    cache_stats=self.cache_stats,
+                    stop_at=stop_at,
+                    on_progress=(lambda text: self.on_progress(self.name, text)) if self.on_progress else None,
+                    llm_stats=self.llm_stats
+                )
+                attributes["output_tokens"] = estimate_part_tokens(text)
+        except Exception:
+            self.history.pop()
+            raise
+        self.history.append({"role": "model", "parts": [text]})
+        return text
 
-# 1. Coder Agent
-coder = Agent(
-    name="Coder",
-    system_instruction="""You are a Senior Python Dev specializing in GUI (tkinter, curses). 
+AGENT_INSTRUCTIONS = {
+    # 1. Coder Agent
+    "Coder": """You are a Senior Python Dev specializing in GUI (tkinter, curses). 
     Task: Write Python code to solve the problem. 
     Important requirements: 
     1. Code must be runnable, with a main loop (e.g., window.mainloop() in tkinter).
-    2. ONLY RETURN RAW CODE INSIDE A ```python ... ``` BLOCK. Do not explain anything else."""
-)
+    2. ONLY RETURN RAW CODE INSIDE A ```python ... ``` BLOCK. Do not explain anything else.
+    3. When asked to edit existing code, answer in the requested edit format instead.""",
+
+    # 2. Reviewer Agent (Code Quality)
+    "Reviewer": "You are a QA Engineer specialized in code. Task: Review Python code. Check for logic errors, potential crashes, security issues. If code is good, reply 'APPROVED'. If not, point out specific errors in the code.",
 
-# 2. Reviewer Agent (Code Quality)
-reviewer = Agent(
-    name="Reviewer",
-    system_instruction="You are a QA Engineer specialized in code. Task: Review Python code. Check for logic errors, potential crashes, security issues. If code is good, reply 'APPROVED'. If not, point out specific errors in the code."
-)
+    # 3. Designer Agent (Visual Quality - NEW)
+    "Designer": "You are a UI/UX Designer. Task: Look at the game interface screenshot and evaluate. If the interface is beautiful and intuitive, reply 'APPROVED'. If it looks bad or hard to see, provide specific feedback for the Coder to improve the interface."
+}
 
-# 3. Designer Agent (Visual Quality - NEW)
-designer = Agent(
-    name="Designer",
-    system_instruction="You are a UI/UX Designer. Task: Look at the game interface screenshot and evaluate. If the interface is beautiful and intuitive, reply 'APPROVED'. If it looks bad or hard to see, provide specific feedback for the Coder to improve the interface."
-)
+# --- CODER EDIT MODE ---
+# After the first version, "diff": the Coder sends only the changed lines (SEARCH/REPLACE blocks
+# or a unified diff, applied by code_patch.py); "full": the Coder rewrites the whole program.
+# Override per task with options["edit_mode"].
+CODER_EDIT_MODES = ("diff", "full")
+CODER_EDIT_MODE = os.getenv("A2A_CODER_EDIT_MODE", "diff")
+
+FULL_CODE_INSTRUCTION = "Return the complete updated code in a ```python block."
+EDIT_FORMAT_INSTRUCTION = """Edit the current code below instead of rewriting it. Reply ONLY with SEARCH/REPLACE blocks:
+<<<<<<< SEARCH
+(whole lines copied exactly from the current code)
+=======
+(new lines)
+>>>>>>> REPLACE
+Each SEARCH must match exactly one place; use several blocks for several changes.
+Only if most of the program has to change, return the complete code in a ```python block instead."""
+
+def create_agents(use_cache=True, cache_stats=None, llm_stats=None, on_progress=None, tracer=None):
+    """Fresh Coder / Reviewer / Designer sessions for one task (models come from the shared pool)."""
+    return {
+        name: Agent(name, instruction, use_cache=use_cache, cache_stats=cache_stats,
+                    llm_stats=llm_stats, on_progress=on_progress, tracer=tracer)
+        for name, instruction in AGENT_INSTRUCTIONS.items()
+    }
 
 # --- SUPERVISOR NODE (ENHANCED) ---
-def supervisor_node(history_context, latest_code=None, execution_status=None, reviewer_feedback=None, designer_feedback=None):
-    system_instruction = """
+# Default decision mode, can be overridden per task with options["supervisor_mode"]:
+# - "llm": ask Gemini at every step (original behaviour)
+# - "hybrid": deterministic transitions handled locally, Gemini only for ambiguous feedback
+# - "rules": never call Gemini, feedback is forwarded to the Coder as-is
+SUPERVISOR_MODES = ("llm", "hybrid", "rules")
+SUPERVISOR_MODE = os.getenv("A2A_SUPERVISOR_MODE", "hybrid")
+
+SUPERVISOR_INSTRUCTION = """
     You are a Software Project Manager. You have staff: ['Coder', 'Reviewer', 'Designer'].
     You have an additional execution system (System Executor) to run code.
 
@@ -148,22 +294,30 @@ def supervisor_node(history_context, latest_code=None, execution_status=None, re
     
     STATE 3: Execution System returned result.
     - If 'EXECUTION_ERROR' (Code failed to run): -> Re-assign 'Coder' with error info to fix.
-    - If 'EXECUTION_SUCCESS' (Ran and screenshot taken): -> Assign simultaneously to 'Reviewer' (check code) and 'Designer' (check image).
-      (At this step, you need to order checks from both. Prioritize assigning Reviewer first in output json).
+    - If 'EXECUTION_SUCCESS' (Ran and screenshot taken): -> Assign 'REVIEW': 'Reviewer' (check code) and 'Designer' (check image) work simultaneously.
+      (You may add "reviewer_instruction" and "designer_instruction" to the output json).
 
     STATE 4: Feedback received from Reviewer and Designer.
     - If both Reviewer and Designer 'APPROVED' -> Reply 'FINISH'.
     - If anyone NOT APPROVED -> Summarize errors and re-assign 'Coder' to fix.
     (NOTE: After Coder fixes, process returns to STATE 2 -> MUST 'EXECUTE' again).
 
-    OUTPUT JSON FORMAT: {"next_agent": "Agent_Name_Or_EXECUTE_Or_FINISH", "instruction": "Detailed instruction for that agent based on current situation"}
+    OUTPUT JSON FORMAT: {"next_agent": "Agent_Name_Or_EXECUTE_Or_REVIEW_Or_FINISH", "instruction": "Detailed instruction for that agent based on current situation"}
     """
-    
-    model = genai.GenerativeModel(
-        MODEL_NAME, 
-        system_instruction=system_instruction,
-        generation_config={"response_mime_type": "application/json"}
-    )
+
+SUPERVISOR_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+def get_supervisor_model():
+    # The backend builds the model once and shares it: it is stateless between calls
+    return LLM.model("Supervisor", SUPERVISOR_INSTRUCTION, SUPERVISOR_GENERATION_CONFIG)
+
+def is_approved(feedback):
+    """Reviewer/Designer verdict: 'APPROVED' (ignoring case, spaces and trailing punctuation)."""
+    return bool(feedback) and feedback.strip().strip(".!'\"*").upper() == "APPROVED"
+
+def supervisor_node(history_context, latest_code=None, execution_status=None, reviewer_feedback=None, designer_feedback=None,
+                    use_cache=True, cache_stats=None, llm_stats=None, on_progress=None):
+    model = get_supervisor_model()
     
     # Create prompt summarizing complex situation
     status_prompt = f"Project Status:\n- Original Context: {history_context}\n"
@@ -176,29 +330,162 @@ def supervisor_node(history_context, latest_code=None, execution_status=None, re
     status_prompt += "\nWhat is the verified next step?" 
 
     
-    response = model.generate_content(status_prompt)
-    return json.loads(response.text)
+    return generate_cached(
+        model, status_prompt,
+        use_cache=use_cache, cache_stats=cache_stats, parse=json.loads,
+        # The decision is complete as soon as its JSON object closes
+        stop_at=json_object_end,
+        on_progress=(lambda text: on_progress("Supervisor", text)) if on_progress else None,
+        llm_stats=llm_stats
+    )
+
+def rule_based_supervisor(user_prompt, history_context, latest_code=None, execution_status=None,
+                          reviewer_feedback=None, designer_feedback=None, resolve_ambiguous=False):
+    """
+    Local version of the Supervisor's mandatory STATE 1-4 transitions (no LLM call).
+    Returns a decision dict, or None when the feedback is mixed and needs the LLM
+    to summarize it (unless resolve_ambiguous, then feedback goes to the Coder as-is).
+    """
+    # STATE 1: no code yet
+    if not latest_code:
+        instruction = f"Write Python code for this request: {user_prompt}"
+        if history_context != user_prompt:
+            instruction += f"\nNote: {history_context}"
+        return {"next_agent": "Coder", "instruction": instruction}
+
+    # STATE 2: new code must always be executed
+    if execution_status is None:
+        return {"next_agent": "EXECUTE", "instruction": "Run the new code and capture a screenshot."}
+
+    # STATE 3: execution result
+    if execution_status == "ERROR":
+        return {"next_agent": "Coder", "instruction": "The code failed to run. Fix the error below."}
+    if reviewer_feedback is None and designer_feedback is None:
+        return {"next_agent": "REVIEW", "instruction": "Reviewer and Designer check code and screenshot in parallel."}
+    if reviewer_feedback is None:
+        return {"next_agent": "Reviewer", "instruction": REVIEWER_INSTRUCTION}
+    if designer_feedback is None:
+        return {"next_agent": "Designer", "instruction": DESIGNER_INSTRUCTION}
+
+    # STATE 4: both verdicts available
+    if is_approved(reviewer_feedback) and is_approved(designer_feedback):
+        return {"next_agent": "FINISH", "instruction": "Reviewer and Designer approved the product."}
+    if not resolve_ambiguous:
+        return None
+    return {"next_agent": "Coder", "instruction": "Fix the issues reported below."}
+
+# --- REVIEW HELPERS (Reviewer + Designer can run concurrently) ---
+REVIEWER_INSTRUCTION = "Review this code for logic errors, potential crashes and security issues."
+DESIGNER_INSTRUCTION = "Evaluate this game interface screenshot."
+
+def ask_reviewer(agent, instruction, code):
+    return agent.reply(f"{instruction}\nHere is the code to review:\n```python\n{code}\n```")
+
+def ask_designer(agent, instruction, screenshot):
+    if screenshot is None:
+        return None
+    return agent.reply([instruction, screenshot.upload_image])
 
 # --- MAIN FUNCTION FOR SERVER ---
-def process_task(user_prompt):
+def process_task(user_prompt, on_log=None, options=None):
     """
     Main processing function for A2A Server.
-    Returns dict: {status, message, code, screenshot_path, logs}
+    on_log: optional callback receiving every log line as it happens (used for live streaming).
+    options: optional per-task settings, e.g. {"execution_timeouts": {"window_timeout": 3}, "supervisor_mode": "hybrid",
+             "no_cache": True (skip the LLM response cache), "edit_mode": "diff" | "full"}.
+    Returns dict: {status, message, code, screenshot (PNG bytes), logs, execution_timings, preflight, coder_iterations,
+                   supervisor, designer, agent_history_tokens, llm_cache, llm_calls, trace, trace_summary}
+    trace: timing spans of every supervisor decision, agent call, validation and execution (see tracing.Tracer).
     """
+    options = options or {}
+    supervisor_mode = options.get("supervisor_mode") or SUPERVISOR_MODE
+    if supervisor_mode not in SUPERVISOR_MODES:
+        supervisor_mode = "hybrid"
+    edit_mode = options.get("edit_mode") or CODER_EDIT_MODE
+    if edit_mode not in CODER_EDIT_MODES:
+        edit_mode = "diff"
     logs = []
     def log(msg):
         print(msg)
         logs.append(msg)
+        if on_log:
+            on_log(msg)
 
     log(f"{Fore.GREEN}User Request:{Style.RESET_ALL} {user_prompt}\n")
+
+    # LLM response cache usage of this task
+    use_cache = not options.get("no_cache")
+    llm_cache_stats = {"hits": 0, "misses": 0, "bypassed": 0}
+    # LLM calls of this task: latency, rate-limit waits, retries, streamed answers cut short once complete
+    llm_stats = new_call_stats()
+    tracer = Tracer()
+
+    def stream_progress(name, text):
+        log(f"{Fore.CYAN}[{name}]: receiving... ~{estimate_part_tokens(text)} tokens so far.{Style.RESET_ALL}")
+
+    # Own agent sessions for this task: no history shared with other tasks
+    agents = create_agents(use_cache=use_cache, cache_stats=llm_cache_stats,
+                           llm_stats=llm_stats, on_progress=stream_progress, tracer=tracer)
+    coder, reviewer, designer = agents["Coder"], agents["Reviewer"], agents["Designer"]
     
     # State variables
     current_context = user_prompt
     latest_code = None
     execution_status = None 
-    latest_screenshot_path = None
+    latest_screenshot = None
     reviewer_feedback = None
     designer_feedback = None
+    execution_timings = []
+    supervisor_seconds = []
+    # Decision taken without asking the Supervisor (e.g. after a failed pre-flight validation)
+    forced_decision = None
+    preflight = {"checks": 0, "rejections": 0, "executions_saved": 0, "seconds_saved": 0.0}
+    # One entry per Coder turn: how the code was produced, estimated output tokens and time
+    coder_iterations = []
+    supervisor_stats = {"mode": supervisor_mode, "llm_calls": 0, "rule_decisions": 0, "calls_avoided": 0}
+    # Perceptual hash and verdict of the last frame the Designer approved
+    approved_design = None
+    designer_stats = {"calls": 0, "skipped": 0}
+
+    def review_design(instruction):
+        """Designer verdict on the latest screenshot, reused when the frame looks like the last approved one."""
+        nonlocal approved_design
+        if latest_screenshot is None:
+            return None
+        if approved_design and latest_screenshot.matches(approved_design[0]):
+            designer_stats["skipped"] += 1
+            log(f"{Fore.YELLOW}[Designer]: Screen unchanged since the last approval, verdict reused.{Style.RESET_ALL}")
+            return approved_design[1]
+        designer_stats["calls"] += 1
+        feedback = ask_designer(designer, instruction, latest_screenshot)
+        if is_approved(feedback):
+            approved_design = (latest_screenshot.phash, feedback)
+        return feedback
+
+    def make_result(status, message):
+        return {
+            "status": status,
+            "message": message,
+            "code": latest_code,
+            "screenshot": latest_screenshot.png_bytes() if latest_screenshot else None,
+            "logs": logs,
+            "execution_timings": execution_timings,
+            "preflight": preflight,
+            "coder_iterations": coder_iterations,
+            "supervisor": supervisor_stats,
+            "designer": designer_stats,
+            # Estimated prompt tokens sent on each call, per agent (stays flat thanks to compaction)
+            "agent_history_tokens": {name: agent.history_tokens for name, agent in agents.items()},
+            "llm_cache": llm_cache_stats,
+            "llm_calls": dict(
+                {key: round(value, 2) if isinstance(value, float) else value for key, value in llm_stats.items()},
+                by_agent={name: {"calls": agent["calls"], "seconds": round(agent["seconds"], 2)}
+                          for name, agent in llm_stats["by_agent"].items()},
+                backend=LLM.model_name
+            ),
+            "trace": tracer.spans,
+            "trace_summary": tracer.summary()
+        }
 
     max_steps = 12 
     final_status = "FAILED"
@@ -209,22 +496,36 @@ def process_task(user_prompt):
         
         # 1. Supervisor decision
         try:
-            decision = supervisor_node(
-                current_context, latest_code, execution_status, reviewer_feedback, designer_feedback
-            )
-            next_action = decision.get("next_agent")
-            instruction = decision.get("instruction")
+            with tracer.span("supervisor", step=i + 1) as span:
+                decision, decided_by = None, "rules"
+                if forced_decision:
+                    decision, forced_decision, decided_by = forced_decision, None, "pre-flight"
+                elif supervisor_mode != "llm":
+                    decision = rule_based_supervisor(
+                        user_prompt, current_context, latest_code, execution_status, reviewer_feedback, designer_feedback,
+                        resolve_ambiguous=(supervisor_mode == "rules")
+                    )
+                    if decision:
+                        supervisor_stats["rule_decisions"] += 1
+                        supervisor_stats["calls_avoided"] += 1
+                if decision is None:
+                    supervisor_started = time.time()
+                    decision = supervisor_node(
+                        current_context, latest_code, execution_status, reviewer_feedback, designer_feedback,
+                        use_cache=use_cache, cache_stats=llm_cache_stats,
+                        llm_stats=llm_stats, on_progress=stream_progress
+                    )
+                    supervisor_seconds.append(time.time() - supervisor_started)
+                    supervisor_stats["llm_calls"] += 1
+                    decided_by = "LLM"
+                next_action = decision.get("next_agent")
+                instruction = decision.get("instruction")
+                span.update(decided_by=decided_by, decision=next_action)
         except Exception as e:
             log(f"{Fore.RED}Supervisor Error: {e}{Style.RESET_ALL}")
-            return {
-                "status": "ERROR",
-                "message": f"Supervisor crashed: {e}",
-                "code": latest_code,
-                "screenshot_path": latest_screenshot_path,
-                "logs": logs
-            }
+            return make_result("ERROR", f"Supervisor crashed: {e}")
         
-        log(f"{Fore.MAGENTA}--- Supervisor: Decision -> {next_action} ---{Style.RESET_ALL}")
+        log(f"{Fore.MAGENTA}--- Supervisor ({decided_by}): Decision -> {next_action} ---{Style.RESET_ALL}")
         log(f"{Fore.MAGENTA}Note: {instruction}{Style.RESET_ALL}")
         
         # --- HANDLE ACTIONS ---
@@ -240,7 +541,16 @@ def process_task(user_prompt):
                 log(f"{Fore.RED}[System Error]: Supervisor requested execution but no code available!{Style.RESET_ALL}")
                 break
                 
-            error_msg, screenshot_path = execute_and_capture_screenshot(latest_code)
+            with tracer.span("execute") as span:
+                error_msg, screenshot, timing = EXECUTORS.get(EXECUTOR, execute_and_capture_screenshot)(
+                    latest_code, options.get("execution_timeouts")
+                )
+                span.update(outcome="error" if error_msg else "success", window=timing.get("window_outcome"),
+                            launch_seconds=timing.get("launch_seconds"), first_frame_seconds=timing.get("first_frame_seconds"),
+                            capture_seconds=timing.get("capture_seconds"))
+            execution_timings.append(timing)
+            log(f"{Fore.YELLOW}[Execution]: Finished in {timing['total_seconds']}s "
+                f"(first frame: {timing.get('first_frame_seconds')}s, window: {timing.get('window_outcome')}).{Style.RESET_ALL}")
             
             if error_msg:
                 execution_status = "ERROR"
@@ -250,62 +560,150 @@ def process_task(user_prompt):
                 log(f"{Fore.RED}[Execution]: Code execution error.{Style.RESET_ALL}")
             else:
                 execution_status = "SUCCESS"
-                latest_screenshot_path = screenshot_path
+                latest_screenshot = screenshot
                 current_context = "Code execution successful, screenshot captured."
                 reviewer_feedback = None 
                 designer_feedback = None
-                log(f"{Fore.GREEN}[Execution]: Success. Image: {screenshot_path}{Style.RESET_ALL}")
+                shot = screenshot.describe()
+                log(f"{Fore.GREEN}[Execution]: Success. Screenshot {shot['size'][0]}x{shot['size'][1]} "
+                    f"(uploaded as {shot['upload_size'][0]}x{shot['upload_size'][1]}, hash {shot['phash']}).{Style.RESET_ALL}")
 
         elif next_action == "Coder":
             prompt_parts = [instruction]
             if execution_status == "ERROR":
                  prompt_parts.append(f"\nPrevious Runtime Error Info: {current_context}")
-            if reviewer_feedback and reviewer_feedback != "APPROVED":
+            if reviewer_feedback and not is_approved(reviewer_feedback):
                  prompt_parts.append(f"\nFeedback from Reviewer: {reviewer_feedback}")
-            if designer_feedback and designer_feedback != "APPROVED":
+            if designer_feedback and not is_approved(designer_feedback):
                  prompt_parts.append(f"\nFeedback from Designer (interface): {designer_feedback}")
 
+            # Incremental edit: the Coder sees the current code and sends back only what changes
+            incremental = edit_mode == "diff" and latest_code
+            if incremental:
+                prompt_parts.append(f"\n{EDIT_FORMAT_INSTRUCTION}\n\nCurrent code:\n```python\n{latest_code}\n```")
+            elif latest_code:
+                prompt_parts.append(FULL_CODE_INSTRUCTION)
+
             try:
-                response_text = coder.reply("\n".join(prompt_parts))
-                match = re.search(r'```python(.*?)```', response_text, re.DOTALL)
-                if match:
-                    latest_code = match.group(1).strip()
+                coder_started = time.time()
+                # Stop reading once the code block closes: any explanation after it is not needed
+                response_text = coder.reply("\n".join(prompt_parts), stop_at=code_block_end)
+                output_tokens = estimate_part_tokens(response_text)
+                log(f"{Fore.CYAN}[Coder]: Prompt history ~{coder.last_history_tokens} tokens.{Style.RESET_ALL}")
+                new_code, edit_kind = None, "full"
+                if incremental:
+                    try:
+                        new_code, edit_kind = apply_edit(latest_code, response_text)
+                    except PatchError as e:
+                        # Fall back to a full rewrite in the same step
+                        log(f"{Fore.YELLOW}[Coder]: Edit could not be applied ({e}), asking for the complete code.{Style.RESET_ALL}")
+                        response_text = coder.reply(
+                            f"Your edit could not be applied: {e}\n{FULL_CODE_INSTRUCTION}", stop_at=code_block_end
+                        )
+                        output_tokens += estimate_part_tokens(response_text)
+                        edit_kind = "full_fallback"
+                if new_code is None:
+                    match = re.search(r'```python(.*?)```', response_text, re.DOTALL)
+                    new_code = match.group(1).strip() if match else None
+                coder_iterations.append({
+                    "mode": edit_kind,
+                    "output_tokens": output_tokens,
+                    "seconds": round(time.time() - coder_started, 2),
+                    "code_lines": new_code.count("\n") + 1 if new_code else None
+                })
+                log(f"{Fore.CYAN}[Coder]: {edit_kind} answer, ~{output_tokens} output tokens "
+                    f"in {coder_iterations[-1]['seconds']}s.{Style.RESET_ALL}")
+                if new_code:
+                    latest_code = new_code
                     log(f"{Fore.CYAN}[Coder]: Submitted new code.{Style.RESET_ALL}")
                     execution_status = None
                     reviewer_feedback = None
                     designer_feedback = None
+
+                    # Pre-flight validation: reject broken code without running it
+                    preflight["checks"] += 1
+                    with tracer.span("validate") as span:
+                        validation_error = validate_code(latest_code)
+                        span["passed"] = not validation_error
+                    if validation_error:
+                        execution_status = "ERROR"
+                        current_context = f"Error running code (pre-flight validation):\n{validation_error}"
+                        forced_decision = {
+                            "next_agent": "Coder",
+                            "instruction": "Your code failed pre-flight validation and was not executed. Fix it."
+                        }
+                        # Saved: one execution plus the Supervisor round trip that would have routed the error back
+                        saved = execution_timings[-1]["total_seconds"] if execution_timings else ESTIMATED_EXECUTION_SECONDS
+                        saved += sum(supervisor_seconds) / len(supervisor_seconds) if supervisor_seconds else 0
+                        preflight["rejections"] += 1
+                        preflight["executions_saved"] += 1
+                        preflight["seconds_saved"] = round(preflight["seconds_saved"] + saved, 2)
+                        log(f"{Fore.RED}[Pre-flight]: {validation_error}{Style.RESET_ALL}")
                 else:
                     log(f"{Fore.RED}[Coder Error]: Invalid code format.{Style.RESET_ALL}")
                     current_context = "Coder did not return code in correct format ```python ... ```."
             except Exception as e:
                 log(f"{Fore.RED}[Coder Error]: {e}{Style.RESET_ALL}")
 
+        elif next_action == "REVIEW" or (
+                next_action in ("Reviewer", "Designer") and reviewer_feedback is None and designer_feedback is None):
+            # Fan-out: Reviewer (code) and Designer (screenshot) at the same time, joined in one step
+            if not latest_code:
+                 log(f"{Fore.RED}[System Error]: No code to review.{Style.RESET_ALL}")
+                 continue
+            review_started = time.time()
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                reviewer_future = pool.submit(
+                    ask_reviewer, reviewer, decision.get("reviewer_instruction") or REVIEWER_INSTRUCTION, latest_code
+                )
+                designer_future = pool.submit(
+                    review_design, decision.get("designer_instruction") or DESIGNER_INSTRUCTION
+                )
+                reviewer_feedback = reviewer_future.result()
+                designer_feedback = designer_future.result()
+            log(f"{Fore.BLUE}[Reviewer]: {reviewer_feedback}{Style.RESET_ALL}")
+            if designer_feedback is None:
+                 log(f"{Fore.RED}[System Error]: Image not found for Designer.{Style.RESET_ALL}")
+                 designer_feedback = "No image available for evaluation."
+            else:
+                 log(f"{Fore.YELLOW}[Designer]: {designer_feedback}{Style.RESET_ALL}")
+            log(f"{Fore.WHITE}[Review]: Reviewer + Designer finished in parallel in {time.time() - review_started:.1f}s "
+                f"(history ~{reviewer.last_history_tokens} / ~{designer.last_history_tokens} tokens).{Style.RESET_ALL}")
+
         elif next_action == "Reviewer":
             if not latest_code:
                  log(f"{Fore.RED}[System Error]: No code to review.{Style.RESET_ALL}")
                  continue
-            response_text = reviewer.reply(f"{instruction}\nHere is the code to review:\n```python\n{latest_code}\n```")
-            reviewer_feedback = response_text
+            reviewer_feedback = ask_reviewer(reviewer, instruction, latest_code)
             log(f"{Fore.BLUE}[Reviewer]: {reviewer_feedback}{Style.RESET_ALL}")
 
         elif next_action == "Designer":
-            if not latest_screenshot_path or not os.path.exists(latest_screenshot_path):
+            designer_feedback = review_design(instruction)
+            if designer_feedback is None:
                  log(f"{Fore.RED}[System Error]: Image not found for Designer.{Style.RESET_ALL}")
                  designer_feedback = "No image available for evaluation."
                  continue
-            
-            img = Image.open(latest_screenshot_path)
-            response_text = designer.reply([instruction, img])
-            designer_feedback = response_text
             log(f"{Fore.YELLOW}[Designer]: {designer_feedback}{Style.RESET_ALL}")
 
-    return {
-        "status": final_status,
-        "message": final_message,
-        "code": latest_code,
-        "screenshot_path": latest_screenshot_path,
-        "logs": logs
-    }
+    log(f"{Fore.MAGENTA}[Supervisor]: mode={supervisor_mode}, LLM calls={supervisor_stats['llm_calls']}, "
+        f"calls avoided={supervisor_stats['calls_avoided']}.{Style.RESET_ALL}")
+    if llm_cache_stats["hits"]:
+        log(f"{Fore.YELLOW}[LLM Cache]: {llm_cache_stats['hits']} cached response(s) reused, "
+            f"{llm_cache_stats['misses']} miss(es).{Style.RESET_ALL}")
+    if len(coder_iterations) > 1:
+        edits = [it for it in coder_iterations[1:] if it["mode"] in ("search_replace", "diff")]
+        log(f"{Fore.CYAN}[Coder]: {len(edits)}/{len(coder_iterations) - 1} fix round(s) sent as edits, "
+            f"~{sum(it['output_tokens'] for it in coder_iterations)} output tokens in total.{Style.RESET_ALL}")
+    if llm_stats["calls"]:
+        log(f"{Fore.CYAN}[LLM]: {llm_stats['calls']} call(s) to {LLM.model_name} in {llm_stats['seconds']:.1f}s, "
+            f"{llm_stats['early_stops']} cut short once complete, {llm_stats['retries']} retried, "
+            f"{llm_stats['wait_seconds']:.1f}s waiting for rate limits.{Style.RESET_ALL}")
+    if designer_stats["skipped"]:
+        log(f"{Fore.YELLOW}[Designer]: {designer_stats['skipped']} review(s) skipped, screen unchanged.{Style.RESET_ALL}")
+    if preflight["rejections"]:
+        log(f"{Fore.YELLOW}[Pre-flight]: Skipped {preflight['executions_saved']} execution(s), "
+            f"saved ~{preflight['seconds_saved']}s.{Style.RESET_ALL}")
+    return make_result(final_status, final_message)
 
 if __name__ == "__main__":
     user_request = "Write a classic Tetris game in Python using Tkinter library. Require clear interface, score display, and game over."
@@ -0,0 +1,356 @@
+"""
+Every LLM call of the agents goes through `LLM` (an `LLMClient`):
+process-wide rate limiting (requests and tokens per minute), a cap on concurrent
+calls, retries with jittered backoff for rate-limit / transient errors, and
+latency accounting. The provider itself is a pluggable backend:
+
+- "gemini": Google Gemini through google.generativeai (configured on first use)
+- "stub": deterministic local answers with configurable latency, for offline runs and load tests
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from chat_history import estimate_part_tokens, estimate_tokens
+from llm_stream import stream_generate
+from metrics import LLM_CALL_SECONDS, LLM_CALLS
+
+# --- CONFIGURATION ---
+LLM_BACKEND = os.getenv("A2A_LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("A2A_GEMINI_MODEL", "gemini-2.5-flash")
+# Provider quotas shared by every task of this process; 0 = unlimited
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("A2A_LLM_RPM", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("A2A_LLM_TPM", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("A2A_LLM_CONCURRENCY", "8"))
+# Retries of rate-limit / transient errors, exponential backoff with jitter
+LLM_MAX_RETRIES = int(os.getenv("A2A_LLM_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("A2A_LLM_RETRY_BASE", "1.0"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("A2A_LLM_RETRY_MAX", "30"))
+# Stub backend: total seconds per answer (spread over its chunks) and share of calls failing with a 429
+STUB_LATENCY_SECONDS = float(os.getenv("A2A_STUB_LATENCY", "0.2"))
+STUB_ERROR_RATE = float(os.getenv("A2A_STUB_ERROR_RATE", "0"))
+STUB_CHUNKS = 4
+
+# HTTP statuses worth retrying (google.api_core errors carry them in `.code`)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Provider error with an HTTP-like status code (raised by the stub backend)."""
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def is_retryable(error):
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, "code", None)
+    code = getattr(code, "value", code)  # grpc status enums
+    return code in RETRYABLE_STATUS_CODES
+
+
+def retry_delay(attempt, base=LLM_RETRY_BASE_SECONDS, cap=LLM_RETRY_MAX_SECONDS):
+    """Exponential backoff with full jitter, so throttled tasks do not retry in lockstep."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def estimate_contents_tokens(contents):
+    if isinstance(contents, list) and contents and isinstance(contents[0], dict):
+        return estimate_tokens(contents)
+    parts = contents if isinstance(contents, list) else [contents]
+    return sum(estimate_part_tokens(part) for part in parts)
+
+
+class LLMModel:
+    """Handle for one configured model: who uses it, its instruction/config, and the backend's own object."""
+    def __init__(self, name, system_instruction, generation_config, native=None):
+        self.name = name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config
+        self.native = native
+
+
+# --- BACKENDS ---
+class LLMBackend:
+    """Provider interface: build model handles, answer in one piece or as a stream of text chunks."""
+    model_name = None
+
+    def model(self, name, system_instruction, generation_config=None):
+        return LLMModel(name, system_instruction, generation_config)
+
+    def generate(self, model, contents):
+        raise NotImplementedError
+
+    def stream(self, model, contents):
+        yield self.generate(model, contents)
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini. The SDK is imported and configured on the first model request, not at import.
+    GenerativeModel objects hold no conversation state, so they are shared by every task.
+    """
+    def __init__(self, model_name=GEMINI_MODEL):
+        self.model_name = model_name
+        self._genai = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _configure(self):
+        if self._genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            self._genai = genai
+        return self._genai
+
+    def model(self, name, system_instruction, generation_config=None):
+        key = (system_instruction, json.dumps(generation_config, sort_keys=True))
+        with self._lock:
+            genai = self._configure()
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(
+                    self.model_name,
+                    system_instruction=system_instruction,
+                    generation_config=generation_config
+                )
+            return LLMModel(name, system_instruction, generation_config, self._models[key])
+
+    def generate(self, model, contents):
+        return model.native.generate_content(contents).text
+
+    def stream(self, model, contents):
+        response = model.native.generate_content(contents, stream=True)
+        streamed = False
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. only a finish reason)
+                continue
+            streamed = streamed or bool(text)
+            yield text
+        if not streamed:
+            # Nothing streamed: surface the SDK's own error (blocked prompt, empty candidate, ...)
+            yield response.text
+
+
+STUB_GAME = '''import tkinter as tk
+
+root = tk.Tk()
+root.title("Stub Game")
+canvas = tk.Canvas(root, width=320, height=240, bg="black")
+canvas.pack()
+canvas.create_rectangle(140, 100, 180, 140, fill="lime")
+canvas.create_text(160, 20, text="Score: 0", fill="white")
+root.mainloop()'''
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic local model: same prompt, same answer, no network.
+    Coder -> a small tkinter game, Reviewer/Designer -> APPROVED,
+    Supervisor -> the decision the workflow rules expect.
+    """
+    model_name = "stub"
+
+    def __init__(self, latency=STUB_LATENCY_SECONDS, error_rate=STUB_ERROR_RATE, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _last_text(contents):
+        if isinstance(contents, list) and contents and isinstance(contents[-1], dict):
+            contents = contents[-1]["parts"]
+        parts = contents if isinstance(contents, list) else [contents]
+        return "\n".join(part for part in parts if isinstance(part, str))
+
+    @staticmethod
+    def _decision(prompt):
+        feedback = re.findall(r"- (?:Reviewer|Designer) Feedback: (.*)", prompt)
+        if "EXECUTION_ERROR" in prompt:
+            return {"next_agent": "Coder", "instruction": "Fix the execution error."}
+        if feedback:
+            if all(line.strip().strip(".!'\"*").upper() == "APPROVED" for line in feedback):
+                return {"next_agent": "FINISH", "instruction": "Reviewer and Designer approved the product."}
+            return {"next_agent": "Coder", "instruction": "Fix: " + " ".join(feedback)}
+        if "EXECUTION_SUCCESS" in prompt:
+            return {"next_agent": "REVIEW", "instruction": "Review the code and the screenshot."}
+        if "not yet tested" in prompt:
+            return {"next_agent": "EXECUTE", "instruction": "Run the new code."}
+        return {"next_agent": "Coder", "instruction": "Write the game."}
+
+    def answer(self, model, contents):
+        if model.name == "Coder":
+            return f"```python\n{STUB_GAME}\n```"
+        if model.name == "Supervisor":
+            return json.dumps(self._decision(self._last_text(contents)))
+        return "APPROVED"
+
+    def _maybe_fail(self):
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            raise LLMError("Stub quota exceeded", code=429)
+
+    def generate(self, model, contents):
+        self._maybe_fail()
+        time.sleep(self.latency)
+        return self.answer(model, contents)
+
+    def stream(self, model, contents):
+        self._maybe_fail()
+        text = self.answer(model, contents)
+        size = max(1, -(-len(text) // STUB_CHUNKS))
+        for start in range(0, len(text), size):
+            time.sleep(self.latency / STUB_CHUNKS)
+            yield text[start:start + size]
+
+
+LLM_BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+
+# --- RATE LIMITING ---
+class TokenBucket:
+    """Holds up to `per_minute` units, refilled continuously. per_minute=0 means unlimited."""
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        """Block until `amount` units are available and take them. Returns the seconds waited."""
+        if not self.rate:
+            return 0.0
+        # A request larger than the whole bucket would never fit: it waits for a full bucket instead
+        needed = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill_locked()
+                if self.level >= needed:
+                    self.level -= amount
+                    return waited
+                delay = (needed - self.level) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def consume(self, amount):
+        """Take units without waiting (e.g. output tokens known only after the call); may go into debt."""
+        if self.rate:
+            with self._lock:
+                self._refill_locked()
+                self.level -= amount
+
+
+class LLMClient:
+    """Rate-limited, retrying front of an LLM backend. One instance is shared by the whole process."""
+    def __init__(self, backend, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 max_concurrency=LLM_MAX_CONCURRENCY, max_retries=LLM_MAX_RETRIES):
+        self.backend = backend
+        self.max_retries = max_retries
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._lock = threading.Lock()
+        self._totals = {"calls": 0, "retries": 0, "errors": 0, "seconds": 0.0, "wait_seconds": 0.0, "in_flight": 0}
+
+    @property
+    def model_name(self):
+        return self.backend.model_name
+
+    def model(self, name, system_instruction, generation_config=None):
+        return self.backend.model(name, system_instruction, generation_config)
+
+    def _record(self, call_stats, model, seconds, waited, retried=False, failed=False):
+        with self._lock:
+            self._totals["calls"] += 1
+            self._totals["retries"] += int(retried)
+            self._totals["errors"] += int(failed)
+            self._totals["seconds"] += seconds
+            self._totals["wait_seconds"] += waited
+        LLM_CALLS.inc(agent=model.name, outcome="retried" if retried else "error" if failed else "ok")
+        LLM_CALL_SECONDS.observe(seconds, agent=model.name)
+        if call_stats is not None:
+            call_stats["calls"] += 1
+            call_stats["retries"] += int(retried)
+            call_stats["errors"] += int(failed)
+            call_stats["seconds"] += seconds
+            call_stats["wait_seconds"] += waited
+            agent = call_stats["by_agent"].setdefault(model.name, {"calls": 0, "seconds": 0.0})
+            agent["calls"] += 1
+            agent["seconds"] += seconds
+
+    def generate(self, model, contents, stream=False, stop_at=None, on_progress=None, call_stats=None):
+        """
+        Answer text for `contents`, waiting for rate-limit budget and a free slot first.
+        stream: read the answer chunk by chunk (see llm_stream.stream_generate for stop_at / on_progress).
+        call_stats: optional per-task dict, see new_call_stats().
+        Retryable errors are retried up to max_retries times; the last error is raised.
+        """
+        prompt_tokens = estimate_contents_tokens(contents)
+        attempt = 0
+        while True:
+            wait_started = time.time()
+            self._requests.acquire(1)
+            self._tokens.acquire(prompt_tokens)
+            self._slots.acquire()
+            waited = time.time() - wait_started
+            with self._lock:
+                self._totals["in_flight"] += 1
+            started = time.time()
+            try:
+                if stream:
+                    text = stream_generate(self.backend.stream(model, contents), stop_at, on_progress, call_stats)
+                else:
+                    text = self.backend.generate(model, contents)
+            except Exception as e:
+                retry = attempt < self.max_retries and is_retryable(e)
+                self._record(call_stats, model, time.time() - started, waited, retried=retry, failed=not retry)
+                if not retry:
+                    raise
+                delay = retry_delay(attempt)
+                print(f"[LLM]: {model.name} call failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                attempt += 1
+            else:
+                self._record(call_stats, model, time.time() - started, waited)
+                self._tokens.consume(estimate_part_tokens(text))
+                return text
+            finally:
+                with self._lock:
+                    self._totals["in_flight"] -= 1
+                self._slots.release()
+            time.sleep(delay)
+
+    def stats(self):
+        """Process-wide totals since start."""
+        with self._lock:
+            return dict(self._totals, backend=self.model_name)
+
+
+def new_call_stats():
+    """Per-task LLM call accounting, filled by LLMClient.generate and stream_generate."""
+    return {"calls": 0, "retries": 0, "errors": 0, "seconds": 0.0, "wait_seconds": 0.0,
+            "early_stops": 0, "first_chunk_seconds": 0.0, "by_agent": {}}
+
+
+def create_llm_client():
+    backend = LLM_BACKENDS.get(LLM_BACKEND)
+    if backend is None:
+        raise ValueError(f"Unknown A2A_LLM_BACKEND: {LLM_BACKEND} (expected one of {', '.join(LLM_BACKENDS)})")
+    return LLMClient(backend())
+
+
+LLM = create_llm_client()
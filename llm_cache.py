@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# --- CONFIGURATION ---
+LLM_CACHE_ENABLED = os.getenv("A2A_LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("A2A_LLM_CACHE_MB", "64")) * 1024 * 1024)
+# Optional persistent tier (survives restarts). Unset = memory only
+LLM_CACHE_DIR = os.getenv("A2A_LLM_CACHE_DIR") or None
+
+
+def _update_digest(digest, value):
+    """Feed any prompt structure (text, image, dict, list) into a hash, deterministically."""
+    if isinstance(value, str):
+        digest.update(b"s")
+        digest.update(value.encode("utf-8"))
+    elif isinstance(value, Image.Image):
+        # Images are hashed by pixels, so re-encoded/re-opened screenshots still match
+        digest.update(b"i")
+        digest.update(f"{value.mode}:{value.size}".encode())
+        digest.update(hashlib.sha256(value.tobytes()).digest())
+    elif isinstance(value, dict):
+        digest.update(b"d")
+        for key in sorted(value):
+            _update_digest(digest, str(key))
+            _update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"l{len(value)}".encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif value is None:
+        digest.update(b"n")
+    else:
+        digest.update(b"o")
+        digest.update(repr(value).encode("utf-8"))
+    digest.update(b"\x00")
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of LLM text responses.
+    Key = hash(model name, system instruction, generation config, full contents incl. history).
+    Memory tier: LRU evicted by total size in bytes. Disk tier: one JSON file per key.
+    """
+    def __init__(self, max_bytes=LLM_CACHE_MAX_BYTES, disk_dir=LLM_CACHE_DIR, enabled=LLM_CACHE_ENABLED):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.enabled = enabled
+        self._entries = OrderedDict()  # key -> text
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_name, system_instruction, contents, generation_config=None):
+        digest = hashlib.sha256()
+        for value in (model_name, system_instruction, generation_config, contents):
+            _update_digest(digest, value)
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached text or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key]
+
+        text = self._read_disk(key) if self.disk_dir else None
+        with self._lock:
+            if text is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._store_locked(key, text)
+        return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._store_locked(key, text)
+        if self.disk_dir:
+            self._write_disk(key, text)
+
+    def _store_locked(self, key, text):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key).encode("utf-8"))
+        self._entries[key] = text
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.encode("utf-8"))
+            self._stats["evictions"] += 1
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)["text"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, text):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file then rename, so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"text": text}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[LLM Cache]: Could not persist entry {key[:12]}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
+
+
+LLM_CACHE = LLMResponseCache()
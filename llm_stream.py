@@ -0,0 +1,84 @@
+import os
+import time
+
+# --- CONFIGURATION ---
+LLM_STREAMING_ENABLED = os.getenv("A2A_LLM_STREAMING", "1") != "0"
+# Minimum gap between two "receiving..." progress lines of one call in the task log
+STREAM_PROGRESS_SECONDS = float(os.getenv("A2A_STREAM_PROGRESS_SECONDS", "2.0"))
+
+EDIT_MARKER = "<<<<<<< SEARCH"
+CODE_FENCES = ("```python", "```diff", "```patch")
+
+
+def code_block_end(text):
+    """
+    End of the first complete ```python / ```diff block in `text`, or None while it is still open.
+    SEARCH/REPLACE answers have no closing marker of their own, so they are always read to the end.
+    """
+    if EDIT_MARKER in text:
+        return None
+    starts = [i for i in (text.find(fence) for fence in CODE_FENCES) if i >= 0]
+    if not starts:
+        return None
+    body = text.find("\n", min(starts))
+    if body < 0:
+        return None
+    close = text.find("```", body)
+    return None if close < 0 else close + 3
+
+
+def json_object_end(text):
+    """End of the first complete top-level JSON object in `text` (string-aware), or None."""
+    depth, in_string, escaped = 0, False, False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = depth > 0
+        elif char == "{":
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def stream_generate(chunks, stop_at=None, on_progress=None, call_stats=None):
+    """
+    Assemble a stream of text chunks (LLMBackend.stream) into the answer text.
+    stop_at: function(text) -> end index or None; once it returns an index the stream is
+             abandoned and the text is cut there (the rest of the answer is never waited for).
+    on_progress: function(text_so_far), called at most every STREAM_PROGRESS_SECONDS.
+    call_stats: optional dict counting "early_stops" and "first_chunk_seconds".
+    """
+    started = time.time()
+    last_progress = started
+    text = ""
+    received = 0
+    stopped = False
+    try:
+        for chunk in chunks:
+            received += 1
+            if received == 1 and call_stats is not None:
+                call_stats["first_chunk_seconds"] += time.time() - started
+            text += chunk
+            end = stop_at(text) if stop_at else None
+            if end is not None:
+                text, stopped = text[:end], True
+                break
+            if on_progress and time.time() - last_progress >= STREAM_PROGRESS_SECONDS:
+                last_progress = time.time()
+                on_progress(text)
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+    if call_stats is not None:
+        call_stats["early_stops"] += int(stopped)
+    return text
@@ -0,0 +1,102 @@
+"""
+Process-wide counters and histograms, rendered in the Prometheus text format (GET /metrics).
+Kept dependency-free: no prometheus_client needed.
+"""
+import bisect
+import threading
+
+# Latency buckets (seconds) shared by every histogram: LLM calls and workflow steps take 0.1s to minutes
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels_text(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, ('le', le))} {cumulative}")
+                labels = _labels_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_number(series[-1])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render_gauges(name, help_text, values, labelname=None):
+    """Gauge lines for values read at scrape time: a number, or {label value: number} with `labelname`."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    if labelname is None:
+        lines.append(f"{name} {_number(values)}")
+    else:
+        for label, value in sorted(values.items()):
+            lines.append(f"{name}{_labels_text((labelname,), (label,))} {_number(value)}")
+    return lines
+
+
+# --- METRICS OF THIS PROCESS ---
+STEP_SECONDS = Histogram("a2a_step_seconds", "Duration of workflow steps (supervisor, agent calls, validation, execution).", ["step"])
+LLM_CALLS = Counter("a2a_llm_calls_total", "LLM calls by agent and outcome (ok, retried, error).", ["agent", "outcome"])
+LLM_CALL_SECONDS = Histogram("a2a_llm_call_seconds", "LLM call latency, rate-limit waits excluded.", ["agent"])
+TASKS_FINISHED = Counter("a2a_tasks_finished_total", "Tasks run to the end by this process, by final status.", ["status"])
+TASK_SECONDS = Histogram("a2a_task_seconds", "End-to-end task latency, from submission to final status.")
+
+METRICS = [STEP_SECONDS, LLM_CALLS, LLM_CALL_SECONDS, TASKS_FINISHED, TASK_SECONDS]
+
+
+def render_metrics(extra_lines=()):
+    """Prometheus text exposition of every metric above, plus scrape-time gauges."""
+    lines = list(extra_lines)
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,87 @@
+import io
+import os
+
+from PIL import Image, ImageChops
+
+# --- CONFIGURATION ---
+# Longest side (pixels) of the image uploaded to the Designer; 0 = no downscaling
+SCREENSHOT_MAX_SIDE = int(os.getenv("A2A_SCREENSHOT_MAX_SIDE", "1024"))
+# Frames whose perceptual hashes differ in at most this many of 64 bits count as "visually the same"
+SCREENSHOT_HASH_DISTANCE = int(os.getenv("A2A_SCREENSHOT_HASH_DISTANCE", "4"))
+# Margin kept around the detected game window
+WINDOW_PADDING = 4
+
+
+def window_bbox(frame, background):
+    """Box of the pixels that changed since `background` (the game window), padded, or None."""
+    if background is None or frame.size != background.size:
+        return None
+    bbox = ImageChops.difference(frame.convert("RGB"), background.convert("RGB")).getbbox()
+    if bbox is None:
+        return None
+    left, top, right, bottom = bbox
+    width, height = frame.size
+    return (max(left - WINDOW_PADDING, 0), max(top - WINDOW_PADDING, 0),
+            min(right + WINDOW_PADDING, width), min(bottom + WINDOW_PADDING, height))
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash: robust to scaling and compression, changes when the layout does."""
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hash_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class Screenshot:
+    """
+    One captured game frame, kept in memory.
+    image: cropped to the game window (saved as the task artifact, PNG-encoded once on demand).
+    upload_image: the same frame downscaled to SCREENSHOT_MAX_SIDE, sent to the Designer.
+    phash: perceptual hash used to recognise a frame the Designer has already judged.
+    """
+    def __init__(self, image, source_size, window=None, max_side=SCREENSHOT_MAX_SIDE):
+        self.image = image
+        self.source_size = source_size
+        self.window = window
+        self.upload_image = image
+        if max_side and max(image.size) > max_side:
+            self.upload_image = image.copy()
+            self.upload_image.thumbnail((max_side, max_side), Image.LANCZOS)
+        self.phash = dhash(image)
+        self._png = None
+
+    def matches(self, phash, max_distance=SCREENSHOT_HASH_DISTANCE):
+        return phash is not None and hash_distance(self.phash, phash) <= max_distance
+
+    def png_bytes(self):
+        if self._png is None:
+            buffer = io.BytesIO()
+            self.image.save(buffer, format="PNG")
+            self._png = buffer.getvalue()
+        return self._png
+
+    def describe(self):
+        return {
+            "size": list(self.image.size),
+            "upload_size": list(self.upload_image.size),
+            "screen_size": list(self.source_size),
+            "window": list(self.window) if self.window else None,
+            "phash": f"{self.phash:016x}"
+        }
+
+
+def capture_window(frame, background=None, max_side=SCREENSHOT_MAX_SIDE):
+    """Screenshot of the game window in `frame`: the region that differs from `background` (whole frame if none)."""
+    window = window_bbox(frame, background)
+    image = frame.crop(window) if window else frame
+    return Screenshot(image.convert("RGB"), frame.size, window, max_side)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Options that only control reuse itself and must not split identical requests
+NON_KEY_OPTIONS = ("reuse",)
+
+
+def coalesce_key(prompt, options=None):
+    """Identity of a request: whitespace/case-normalized prompt + the options that affect the run."""
+    normalized_prompt = " ".join(prompt.split()).casefold()
+    key_options = {k: v for k, v in (options or {}).items() if k not in NON_KEY_OPTIONS}
+    payload = json.dumps({"prompt": normalized_prompt, "options": key_options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TaskCoalescer:
+    """
+    Single-flight for task submissions.
+    - In flight: identical submissions attach to the running (primary) task as followers.
+    - Finished: successful results are kept for `result_ttl` seconds and served directly.
+    """
+    def __init__(self, result_ttl=600, max_results=1000):
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._inflight = {}             # key -> primary task_id
+        self._followers = {}            # primary task_id -> [follower task_ids]
+        self._results = OrderedDict()   # key -> (finished_at, primary task_id, result)
+        self._lock = threading.Lock()
+        self._stats = {"coalesced": 0, "reused": 0}
+
+    def recent_result(self, key):
+        """(primary task_id, result) of a recent successful run, or None."""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            finished_at, task_id, result = entry
+            if time.time() - finished_at > self.result_ttl:
+                del self._results[key]
+                return None
+            self._results.move_to_end(key)
+            self._stats["reused"] += 1
+            return task_id, result
+
+    def attach_or_register(self, key, task_id):
+        """
+        Atomically join the in-flight run for `key` (returns its primary task_id)
+        or register `task_id` as the new primary (returns None).
+        """
+        with self._lock:
+            primary = self._inflight.get(key)
+            if primary is not None:
+                self._followers[primary].append(task_id)
+                self._stats["coalesced"] += 1
+                return primary
+            self._inflight[key] = task_id
+            self._followers[task_id] = []
+            return None
+
+    def in_flight(self):
+        """[(key, primary task_id)] of every run that has not completed yet."""
+        with self._lock:
+            return list(self._inflight.items())
+
+    def followers(self, task_id):
+        with self._lock:
+            return list(self._followers.get(task_id, ()))
+
+    def abandon(self, key, task_id):
+        """Primary could not be scheduled: forget it so the next submission starts a new run."""
+        with self._lock:
+            if self._inflight.get(key) == task_id:
+                del self._inflight[key]
+            return self._followers.pop(task_id, [])
+
+    def complete(self, key, task_id, result, reusable=True):
+        """Close the in-flight run. Returns the follower task_ids that share its outcome."""
+        with self._lock:
+            if self._inflight.get(key) == task_id:
+                del self._inflight[key]
+            followers = self._followers.pop(task_id, [])
+            if reusable:
+                self._results[key] = (time.time(), task_id, result)
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+            return followers
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._inflight), "cached_results": len(self._results)}
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from task_store import TERMINAL_STATUSES
+
+# Waiters re-check the store at least this often, so events written by
+# another process (or a missed wake-up) are still picked up
+STORE_POLL_SECONDS = 1.0
+
+
+class _TaskWaiters:
+    """Threads waiting on one task: their condition and a counter bumped on every event of the task."""
+    def __init__(self, lock):
+        self.cond = threading.Condition(lock)
+        self.version = 0
+        self.count = 0
+
+
+class TaskEventHub:
+    """
+    Blocking waits on the event log of a task store.
+    Used to push status transitions and agent log lines to SSE / long-poll clients.
+    Events live in the store (append-only); the hub only wakes up waiters.
+    An event only wakes the waiters of its own task.
+    Each event: {"id": int, "type": "status" | "log", "data": {...}}
+    """
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._waiters = {}  # task_id -> _TaskWaiters, only while someone waits on the task
+
+    def publish(self, task_id, event_type, data, fields=None):
+        """Append an event (and update task `fields` in the same write), then wake up the task's waiters."""
+        event_id = self.store.update(task_id, fields or {}, (event_type, data))
+        with self._lock:
+            waiters = self._waiters.get(task_id)
+            if waiters is not None:
+                waiters.version += 1
+                waiters.cond.notify_all()
+        return event_id
+
+    def last_id(self, task_id):
+        return self.store.last_event_id(task_id)
+
+    def is_closed(self, task_id):
+        status = self.store.status(task_id)
+        return status is None or status in TERMINAL_STATUSES
+
+    def wait_for(self, task_id, after_id=0, timeout=None):
+        """
+        Return events with id > after_id, blocking up to `timeout` seconds until
+        at least one is available. Returns [] on timeout or if the task is finished.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        # Registered before the first read, so an event published in between still wakes us
+        with self._lock:
+            waiters = self._waiters.get(task_id)
+            if waiters is None:
+                waiters = self._waiters[task_id] = _TaskWaiters(self._lock)
+            waiters.count += 1
+        try:
+            while True:
+                with self._lock:
+                    version = waiters.version
+                # Status first: a terminal status is written together with its event
+                closed = self.is_closed(task_id)
+                events = self.store.events(task_id, after_id)
+                if events:
+                    return events
+                if closed:
+                    return []
+                remaining = STORE_POLL_SECONDS if deadline is None else deadline - time.time()
+                if remaining <= 0:
+                    return []
+                with self._lock:
+                    if waiters.version == version:
+                        waiters.cond.wait(min(remaining, STORE_POLL_SECONDS))
+        finally:
+            with self._lock:
+                waiters.count -= 1
+                if not waiters.count:
+                    del self._waiters[task_id]
@@ -0,0 +1,164 @@
+import heapq
+import itertools
+import threading
+import time
+
+# --- PRIORITY MAPPING ---
+# Lower number = served first. Clients send "high" / "normal" / "low" in client_metadata.priority
+PRIORITY_LEVELS = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = PRIORITY_LEVELS["normal"]
+
+# Used for Retry-After until we have measured at least one real task
+DEFAULT_TASK_SECONDS = 60
+
+
+def parse_priority(value):
+    """Convert client priority ("high", "low", 0, ...) into a sortable integer."""
+    if isinstance(value, str):
+        return PRIORITY_LEVELS.get(value.strip().lower(), DEFAULT_PRIORITY)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return max(0, value)
+    return DEFAULT_PRIORITY
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue is full. Carries a Retry-After hint (seconds)."""
+    def __init__(self, retry_after):
+        super().__init__(f"Task queue is full, retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class TaskScheduler:
+    """
+    Fixed-size worker pool fed by a bounded priority queue.
+    Tasks with the same priority are served in submission order (FIFO).
+    """
+    def __init__(self, handler, num_workers=2, max_queue_size=20):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+
+        self._heap = []  # entries: (priority, seq, task_id, args)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._active = 0
+        self._avg_duration = None  # moving average of task runtime (seconds)
+
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"task-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def admit(self):
+        """Raise QueueFullError if a new task would not fit right now (checked again by submit)."""
+        with self._cond:
+            if len(self._heap) >= self.max_queue_size:
+                raise QueueFullError(self._retry_after_locked())
+
+    def submit(self, task_id, priority, *args, force=False):
+        """
+        Queue a task. Returns its 1-based queue position or raises QueueFullError.
+        `force` skips the size check (work that was already admitted, e.g. recovered after a restart).
+        """
+        with self._cond:
+            if not force and len(self._heap) >= self.max_queue_size:
+                raise QueueFullError(self._retry_after_locked())
+            entry = (priority, next(self._seq), task_id, args)
+            heapq.heappush(self._heap, entry)
+            position = sorted(self._heap).index(entry) + 1
+            self._cond.notify()
+            return position
+
+    def position(self, task_id):
+        """1-based position of a waiting task, or None if it is not in the queue."""
+        with self._cond:
+            for index, entry in enumerate(sorted(self._heap)):
+                if entry[2] == task_id:
+                    return index + 1
+        return None
+
+    def retry_after(self):
+        with self._cond:
+            return self._retry_after_locked()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._heap),
+                "active_workers": self._active,
+                "num_workers": self.num_workers,
+                "max_queue_size": self.max_queue_size,
+            }
+
+    def _retry_after_locked(self):
+        # A queue slot frees up each time a worker picks the next task,
+        # which on average happens every (avg task time / number of workers) seconds
+        avg = self._avg_duration or DEFAULT_TASK_SECONDS
+        return max(1, int(avg / max(1, self.num_workers)))
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, task_id, args = heapq.heappop(self._heap)
+                self._active += 1
+
+            started = time.time()
+            try:
+                self.handler(task_id, *args)
+            except Exception as e:
+                print(f"[SCHEDULER]: Worker error on Task {task_id}: {e}")
+            finally:
+                duration = time.time() - started
+                with self._cond:
+                    self._active -= 1
+                    if self._avg_duration is None:
+                        self._avg_duration = duration
+                    else:
+                        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+
+
+class StoreTaskQueue:
+    """
+    Admission control when tasks run in external worker processes (a2a_worker.py).
+    The queue is the task store itself: tasks are stored as QUEUED and claimed by workers.
+    Same interface as TaskScheduler.
+    """
+    def __init__(self, store, max_queue_size=20):
+        self.store = store
+        self.max_queue_size = max_queue_size
+
+    def admit(self):
+        """
+        Raise QueueFullError if the queue is full. Must run before the task is stored:
+        a stored QUEUED row can be claimed by a worker at once, so it is never rejected afterwards.
+        """
+        stats = self.store.queue_stats()
+        if stats["queued"] >= self.max_queue_size:
+            raise QueueFullError(self._retry_after(stats))
+
+    def submit(self, task_id, priority, *args, force=False):
+        """The task is already stored as QUEUED (and admitted): only report its position."""
+        return self.store.queue_position(task_id)
+
+    def position(self, task_id):
+        return self.store.queue_position(task_id)
+
+    def retry_after(self):
+        return self._retry_after(self.store.queue_stats())
+
+    def stats(self):
+        stats = self.store.queue_stats()
+        return {
+            "queued": stats["queued"],
+            "active_workers": stats["running"],
+            "num_workers": stats["workers"],
+            "max_queue_size": self.max_queue_size,
+        }
+
+    @staticmethod
+    def _retry_after(stats):
+        avg = stats["avg_task_seconds"] or DEFAULT_TASK_SECONDS
+        return max(1, int(avg / max(1, stats["workers"])))
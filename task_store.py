@@ -0,0 +1,518 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- CONFIGURATION ---
+# "sqlite" (durable, default) or "memory" (tests / throwaway servers)
+TASK_STORE_BACKEND = os.getenv("A2A_TASK_STORE", "sqlite")
+TASK_DB_PATH = os.getenv("A2A_TASK_DB", "a2a_tasks.db")
+# Finished tasks (and their events) are deleted this many seconds after finishing
+TASK_TTL_SECONDS = int(os.getenv("A2A_TASK_TTL", str(24 * 3600)))
+
+# Statuses after which a task never changes again
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "ERROR")
+# Statuses of work that was accepted but not finished (re-queued after a crash)
+UNFINISHED_STATUSES = ("QUEUED", "Running")
+
+# Result of a task whose workers kept dying (lease expired `max_attempts` times)
+WORKER_LOST_ERROR = "Task abandoned: its worker stopped sending heartbeats too many times."
+# Finished runs averaged for queue_stats()["avg_task_seconds"]
+RECENT_RUNS = 20
+
+# Columns of a task record. options / result are stored as JSON text
+TASK_FIELDS = (
+    "status", "prompt", "priority", "options", "result", "created_at", "started_at",
+    "finished_at", "coalesce_key", "coalesced_with", "reused_from",
+    # Set while an external worker (a2a_worker.py) holds the task
+    "worker_id", "lease_expires_at", "attempts"
+)
+JSON_FIELDS = ("options", "result")
+
+
+def stored_result(result):
+    """Result as persisted: log lines already live in the event log, so they are not stored twice."""
+    return {k: v for k, v in result.items() if k != "logs"}
+
+
+def _with_finish_time(fields):
+    if fields.get("status") in TERMINAL_STATUSES and "finished_at" not in fields:
+        return {**fields, "finished_at": time.time()}
+    return fields
+
+
+class TaskStore:
+    """
+    Storage for tasks and their event log.
+    Task: {"task_id", "status", "prompt", "priority", "options", "result", "created_at", ...}
+    Event: {"id": int, "type": "status" | "log", "data": {...}}, append-only, ids increase.
+    All methods are safe to call from any thread.
+    """
+    def create(self, task_id, fields, event=None):
+        """Insert a task, optionally with its first event. Returns the event id (or None)."""
+        raise NotImplementedError
+
+    def get(self, task_id):
+        """Task dict or None."""
+        raise NotImplementedError
+
+    def get_many(self, task_ids, columns=None):
+        """{task_id: task} for the ids that exist. `columns` limits the fields that are read."""
+        tasks = {task_id: self.get(task_id) for task_id in task_ids}
+        return {task_id: task for task_id, task in tasks.items() if task}
+
+    def status(self, task_id):
+        """Current status or None if the task does not exist."""
+        task = self.get(task_id)
+        return task["status"] if task else None
+
+    def update(self, task_id, fields, event=None, owner=None):
+        """
+        Update fields and append `event` = (type, data) in one step. Returns the event id (or None).
+        With `owner`, nothing is written unless that worker still holds the task's lease.
+        """
+        raise NotImplementedError
+
+    def events(self, task_id, after_id=0, limit=500):
+        """Events with id > after_id, oldest first."""
+        raise NotImplementedError
+
+    def last_event_id(self, task_id):
+        raise NotImplementedError
+
+    def logs(self, task_id):
+        """Messages of all "log" events of a task."""
+        return [e["data"]["message"] for e in self.events(task_id, limit=None) if e["type"] == "log"]
+
+    def delete(self, task_id):
+        raise NotImplementedError
+
+    def unfinished(self):
+        """QUEUED / Running tasks, oldest first (used for recovery after a restart)."""
+        raise NotImplementedError
+
+    def evict_finished(self, ttl=TASK_TTL_SECONDS):
+        """Delete tasks that finished more than `ttl` seconds ago. Returns how many were removed."""
+        raise NotImplementedError
+
+    def counts(self):
+        """{status: number of tasks}"""
+        raise NotImplementedError
+
+    # --- Work queue for external workers ---
+
+    def claim(self, worker_id, lease_seconds, max_attempts=3):
+        """
+        Atomically take the next runnable task (priority, then FIFO) for `worker_id` and mark it Running.
+        Running tasks whose lease expired (crashed worker) are taken over; after `max_attempts`
+        they are failed instead. Returns the task dict or None when there is no work.
+        """
+        raise NotImplementedError
+
+    def renew_lease(self, task_id, worker_id, lease_seconds):
+        """Heartbeat. False if the worker lost the task (lease expired and was taken over)."""
+        raise NotImplementedError
+
+    def queue_position(self, task_id):
+        """1-based position of a QUEUED task among the runnable tasks, or None."""
+        raise NotImplementedError
+
+    def queue_stats(self):
+        """{"queued", "running", "workers" (holding a live lease), "avg_task_seconds" (recent runs or None)}"""
+        raise NotImplementedError
+
+
+class InMemoryTaskStore(TaskStore):
+    """Dict-backed store: fast, not durable. Meant for tests and throwaway servers."""
+    def __init__(self):
+        self._tasks = {}
+        self._events = {}  # task_id -> list of events
+        self._next_event_id = 1
+        self._lock = threading.Lock()
+
+    def _append_locked(self, task_id, event):
+        event_type, data = event
+        record = {"id": self._next_event_id, "type": event_type, "data": data}
+        self._next_event_id += 1
+        self._events.setdefault(task_id, []).append(record)
+        return record["id"]
+
+    def create(self, task_id, fields, event=None):
+        with self._lock:
+            task = dict.fromkeys(TASK_FIELDS)
+            task.update(_with_finish_time(fields), task_id=task_id)
+            self._tasks[task_id] = task
+            return self._append_locked(task_id, event) if event else None
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def get_many(self, task_ids, columns=None):
+        keys = ["task_id"] + [c for c in TASK_FIELDS if columns is None or c in columns]
+        with self._lock:
+            return {
+                task_id: {key: self._tasks[task_id][key] for key in keys}
+                for task_id in task_ids if task_id in self._tasks
+            }
+
+    def update(self, task_id, fields, event=None, owner=None):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or (owner is not None and task["worker_id"] != owner):
+                return None
+            task.update(_with_finish_time(fields))
+            return self._append_locked(task_id, event) if event else None
+
+    def events(self, task_id, after_id=0, limit=500):
+        with self._lock:
+            events = [e for e in self._events.get(task_id, ()) if e["id"] > after_id]
+        return events[:limit] if limit else events
+
+    def last_event_id(self, task_id):
+        with self._lock:
+            events = self._events.get(task_id)
+            return events[-1]["id"] if events else 0
+
+    def delete(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._events.pop(task_id, None)
+
+    def unfinished(self):
+        with self._lock:
+            tasks = [dict(t) for t in self._tasks.values() if t["status"] in UNFINISHED_STATUSES]
+        return sorted(tasks, key=lambda t: t["created_at"] or 0)
+
+    def evict_finished(self, ttl=TASK_TTL_SECONDS):
+        cutoff = time.time() - ttl
+        with self._lock:
+            expired = [tid for tid, t in self._tasks.items() if t["finished_at"] and t["finished_at"] < cutoff]
+            for task_id in expired:
+                del self._tasks[task_id]
+                self._events.pop(task_id, None)
+        return len(expired)
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for task in self._tasks.values():
+                counts[task["status"]] = counts.get(task["status"], 0) + 1
+            return counts
+
+    def _runnable_locked(self):
+        queued = [t for t in self._tasks.values() if t["status"] == "QUEUED" and not t["coalesced_with"]]
+        return sorted(queued, key=lambda t: (t["priority"] or 0, t["created_at"] or 0))
+
+    def claim(self, worker_id, lease_seconds, max_attempts=3):
+        now = time.time()
+        with self._lock:
+            for task in self._tasks.values():
+                if task["status"] == "Running" and task["lease_expires_at"] and task["lease_expires_at"] < now:
+                    if (task["attempts"] or 0) >= max_attempts:
+                        task.update(status="FAILED", result={"error": WORKER_LOST_ERROR}, finished_at=now)
+                        self._append_locked(task["task_id"], ("status", {"status": "FAILED"}))
+                    else:
+                        task["status"] = "QUEUED"
+            runnable = self._runnable_locked()
+            if not runnable:
+                return None
+            task = runnable[0]
+            task.update(status="Running", worker_id=worker_id, lease_expires_at=now + lease_seconds,
+                        started_at=now, attempts=(task["attempts"] or 0) + 1)
+            self._append_locked(task["task_id"], ("status", {"status": "Running"}))
+            return dict(task)
+
+    def renew_lease(self, task_id, worker_id, lease_seconds):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task["worker_id"] != worker_id or task["status"] != "Running":
+                return False
+            task["lease_expires_at"] = time.time() + lease_seconds
+            return True
+
+    def queue_position(self, task_id):
+        with self._lock:
+            for index, task in enumerate(self._runnable_locked()):
+                if task["task_id"] == task_id:
+                    return index + 1
+        return None
+
+    def queue_stats(self):
+        now = time.time()
+        with self._lock:
+            tasks = list(self._tasks.values())
+        running = [t for t in tasks if t["status"] == "Running"]
+        finished = sorted((t for t in tasks if t["finished_at"] and t["started_at"]), key=lambda t: t["finished_at"])
+        durations = [t["finished_at"] - t["started_at"] for t in finished[-RECENT_RUNS:]]
+        return {
+            "queued": sum(1 for t in tasks if t["status"] == "QUEUED" and not t["coalesced_with"]),
+            "running": len(running),
+            "workers": len({t["worker_id"] for t in running if (t["lease_expires_at"] or 0) > now}),
+            "avg_task_seconds": sum(durations) / len(durations) if durations else None,
+        }
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    prompt TEXT,
+    priority INTEGER,
+    options TEXT,
+    result TEXT,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    coalesce_key TEXT,
+    coalesced_with TEXT,
+    reused_from TEXT,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_finished_at ON tasks (finished_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, priority, created_at);
+CREATE TABLE IF NOT EXISTS task_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events (task_id, id);
+"""
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Durable store in a SQLite file (WAL mode: readers never block the writer).
+    Each thread gets its own connection; every write is a single short transaction.
+    """
+    def __init__(self, path=TASK_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._migrate(conn)
+        conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _migrate(conn):
+        """Add columns introduced after a database file was created."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if not columns:
+            return
+        added = {"worker_id": "TEXT", "lease_expires_at": "REAL", "attempts": "INTEGER NOT NULL DEFAULT 0"}
+        with conn:
+            for name, definition in added.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(fields):
+        return {k: json.dumps(v) if k in JSON_FIELDS and v is not None else v for k, v in fields.items()}
+
+    @staticmethod
+    def _decode(row):
+        task = dict(row)
+        for key in JSON_FIELDS:
+            if task[key] is not None:
+                task[key] = json.loads(task[key])
+        return task
+
+    @staticmethod
+    def _insert_event(conn, task_id, event):
+        event_type, data = event
+        cursor = conn.execute(
+            "INSERT INTO task_events (task_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (task_id, event_type, json.dumps(data), time.time())
+        )
+        return cursor.lastrowid
+
+    def create(self, task_id, fields, event=None):
+        fields = self._encode(_with_finish_time(fields))
+        columns = ["task_id"] + list(fields)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"INSERT INTO tasks ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [task_id] + list(fields.values())
+            )
+            return self._insert_event(conn, task_id, event) if event else None
+
+    def get(self, task_id):
+        row = self._conn().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def get_many(self, task_ids, columns=None):
+        task_ids = list(dict.fromkeys(task_ids))
+        selected = ", ".join(["task_id"] + [c for c in TASK_FIELDS if columns is None or c in columns])
+        rows = self._conn().execute(
+            f"SELECT {selected} FROM tasks WHERE task_id IN ({', '.join('?' * len(task_ids))})", task_ids
+        ).fetchall() if task_ids else []
+        tasks = {}
+        for row in rows:
+            task = dict(row)
+            for key in JSON_FIELDS:
+                if task.get(key) is not None:
+                    task[key] = json.loads(task[key])
+            tasks[task["task_id"]] = task
+        return tasks
+
+    def status(self, task_id):
+        row = self._conn().execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row["status"] if row else None
+
+    def update(self, task_id, fields, event=None, owner=None):
+        fields = self._encode(_with_finish_time(fields))
+        unknown = set(fields) - set(TASK_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown task field(s): {', '.join(sorted(unknown))}")
+        where, params = "task_id = ?", [task_id]
+        if owner is not None:
+            where, params = where + " AND worker_id = ?", params + [owner]
+        conn = self._conn()
+        with conn:
+            if fields:
+                assignments = ", ".join(f"{k} = ?" for k in fields)
+                updated = conn.execute(
+                    f"UPDATE tasks SET {assignments} WHERE {where}", list(fields.values()) + params
+                ).rowcount
+            else:
+                updated = conn.execute(f"SELECT 1 FROM tasks WHERE {where}", params).fetchone() is not None
+            if not updated:
+                return None
+            return self._insert_event(conn, task_id, event) if event else None
+
+    def events(self, task_id, after_id=0, limit=500):
+        query = "SELECT id, type, data FROM task_events WHERE task_id = ? AND id > ? ORDER BY id"
+        params = [task_id, after_id]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._conn().execute(query, params).fetchall()
+        return [{"id": row["id"], "type": row["type"], "data": json.loads(row["data"])} for row in rows]
+
+    def last_event_id(self, task_id):
+        row = self._conn().execute("SELECT MAX(id) AS id FROM task_events WHERE task_id = ?", (task_id,)).fetchone()
+        return row["id"] or 0
+
+    def delete(self, task_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM task_events WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def unfinished(self):
+        rows = self._conn().execute(
+            f"SELECT * FROM tasks WHERE status IN ({', '.join('?' * len(UNFINISHED_STATUSES))}) ORDER BY created_at",
+            UNFINISHED_STATUSES
+        ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def evict_finished(self, ttl=TASK_TTL_SECONDS):
+        cutoff = time.time() - ttl
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "DELETE FROM task_events WHERE task_id IN (SELECT task_id FROM tasks WHERE finished_at < ?)", (cutoff,)
+            )
+            return conn.execute("DELETE FROM tasks WHERE finished_at < ?", (cutoff,)).rowcount
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def claim(self, worker_id, lease_seconds, max_attempts=3):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # IMMEDIATE: take the write lock before reading, so two workers never claim the same task
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute(
+                "SELECT task_id, attempts FROM tasks WHERE status = 'Running' AND lease_expires_at < ?", (now,)
+            ).fetchall()
+            for row in expired:
+                if row["attempts"] >= max_attempts:
+                    conn.execute(
+                        "UPDATE tasks SET status = 'FAILED', result = ?, finished_at = ? WHERE task_id = ?",
+                        (json.dumps({"error": WORKER_LOST_ERROR}), now, row["task_id"])
+                    )
+                    self._insert_event(conn, row["task_id"], ("status", {"status": "FAILED"}))
+                else:
+                    conn.execute("UPDATE tasks SET status = 'QUEUED' WHERE task_id = ?", (row["task_id"],))
+
+            row = conn.execute(
+                "SELECT task_id FROM tasks WHERE status = 'QUEUED' AND coalesced_with IS NULL "
+                "ORDER BY priority, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'Running', worker_id = ?, lease_expires_at = ?, started_at = ?, "
+                "attempts = attempts + 1 WHERE task_id = ?",
+                (worker_id, now + lease_seconds, now, row["task_id"])
+            )
+            self._insert_event(conn, row["task_id"], ("status", {"status": "Running"}))
+            task = conn.execute("SELECT * FROM tasks WHERE task_id = ?", (row["task_id"],)).fetchone()
+        return self._decode(task)
+
+    def renew_lease(self, task_id, worker_id, lease_seconds):
+        conn = self._conn()
+        with conn:
+            return conn.execute(
+                "UPDATE tasks SET lease_expires_at = ? WHERE task_id = ? AND worker_id = ? AND status = 'Running'",
+                (time.time() + lease_seconds, task_id, worker_id)
+            ).rowcount == 1
+
+    def queue_position(self, task_id):
+        row = self._conn().execute(
+            "SELECT COUNT(*) AS n FROM tasks t, "
+            "(SELECT priority, created_at FROM tasks WHERE task_id = ? AND status = 'QUEUED') me "
+            "WHERE t.status = 'QUEUED' AND t.coalesced_with IS NULL AND "
+            "(t.priority < me.priority OR (t.priority = me.priority AND t.created_at <= me.created_at))",
+            (task_id,)
+        ).fetchone()
+        return row["n"] or None
+
+    def queue_stats(self):
+        conn = self._conn()
+        now = time.time()
+        queued = conn.execute(
+            "SELECT COUNT(*) AS n FROM tasks WHERE status = 'QUEUED' AND coalesced_with IS NULL"
+        ).fetchone()["n"]
+        running = conn.execute(
+            "SELECT COUNT(*) AS n, COUNT(DISTINCT CASE WHEN lease_expires_at > ? THEN worker_id END) AS workers "
+            "FROM tasks WHERE status = 'Running'", (now,)
+        ).fetchone()
+        avg = conn.execute(
+            "SELECT AVG(finished_at - started_at) AS s FROM (SELECT finished_at, started_at FROM tasks "
+            "WHERE finished_at IS NOT NULL AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+            (RECENT_RUNS,)
+        ).fetchone()["s"]
+        return {"queued": queued, "running": running["n"], "workers": running["workers"], "avg_task_seconds": avg}
+
+
+def create_task_store(backend=TASK_STORE_BACKEND, path=TASK_DB_PATH):
+    """Task store selected by A2A_TASK_STORE ("sqlite" or "memory")."""
+    if backend == "memory":
+        return InMemoryTaskStore()
+    if backend != "sqlite":
+        raise ValueError(f"Unknown task store '{backend}' (expected 'sqlite' or 'memory')")
+    return SQLiteTaskStore(path)
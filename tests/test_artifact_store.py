@@ -0,0 +1,24 @@
+import json
+
+from artifact_store import ArtifactStore
+
+
+def test_trace_and_timings_become_a_trace_artifact(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    spans = [{"name": "coder", "start": 0.0, "seconds": 1.5}] * 50
+    result = store.externalize_result({
+        "status": "COMPLETED",
+        "code": "print('hi')",
+        "trace": spans,
+        "execution_timings": [{"total_seconds": 0.4}],
+        "agent_history_tokens": {"coder": [120]},
+        "trace_summary": {"coder": {"count": 50, "seconds": 75.0}},
+    })
+
+    assert set(result) == {"status", "artifacts", "trace_summary"}
+    ref = result["artifacts"]["trace.json"]
+    assert ref["content_type"] == "application/json"
+    with open(store.path(ref["sha256"]), encoding="utf-8") as f:
+        trace = json.load(f)
+    assert trace == {"trace": spans, "execution_timings": [{"total_seconds": 0.4}], "agent_history_tokens": {"coder": [120]}}
+    assert store.has_gzip(ref["sha256"])
@@ -0,0 +1,33 @@
+import pytest
+
+from code_patch import PatchError, apply_edit, apply_search_replace
+
+
+def test_search_matches_whole_lines_only():
+    code = "a = 1\nbb = 1\nb = 1\n"
+    assert apply_search_replace(code, [("b = 1\n", "b = 2\n")]) == "a = 1\nbb = 1\nb = 2\n"
+
+
+def test_search_inside_a_longer_line_is_not_found():
+    with pytest.raises(PatchError, match="not found"):
+        apply_search_replace("a = 1\nbb = 1\n", [("b = 1\n", "b = 2\n")])
+
+
+def test_substring_of_another_line_is_not_an_ambiguous_match():
+    code = "speed = 10\nbullet_speed = 10\n"
+    assert apply_search_replace(code, [("speed = 10\n", "speed = 12\n")]) == "speed = 12\nbullet_speed = 10\n"
+
+
+def test_repeated_line_needs_more_context():
+    with pytest.raises(PatchError, match="matches 2 places"):
+        apply_search_replace("x = 0\nx = 0\n", [("x = 0\n", "x = 1\n")])
+
+
+def test_trailing_whitespace_is_ignored():
+    code = "def f():\n    return 1   \n"
+    assert apply_search_replace(code, [("    return 1\n", "    return 2\n")]) == "def f():\n    return 2\n"
+
+
+def test_apply_edit_parses_search_replace_blocks():
+    answer = "<<<<<<< SEARCH\nspeed = 10\n=======\nspeed = 12\n>>>>>>> REPLACE"
+    assert apply_edit("speed = 10\nbullet_speed = 10\n", answer) == ("speed = 12\nbullet_speed = 10", "search_replace")
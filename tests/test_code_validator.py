@@ -0,0 +1,59 @@
+import ast
+
+import pytest
+
+from code_validator import _has_main_loop, validate_code
+
+PYGAME_GAME = """
+import pygame
+pygame.init()
+screen = pygame.display.set_mode((320, 240))
+running = True
+while running:
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+    pygame.display.flip()
+"""
+
+TKINTER_GAME = """
+import tkinter as tk
+root = tk.Tk()
+tk.Canvas(root, width=320, height=240).pack()
+root.mainloop()
+"""
+
+QT6_GAME = """
+import sys
+from PyQt6.QtWidgets import QApplication, QWidget
+app = QApplication(sys.argv)
+window = QWidget()
+window.show()
+sys.exit(app.exec())
+"""
+
+QT5_GAME = """
+import sys
+from PySide2.QtWidgets import QApplication, QWidget
+app = QApplication(sys.argv)
+window = QWidget()
+window.show()
+sys.exit(app.exec_())
+"""
+
+
+@pytest.mark.parametrize("code", [PYGAME_GAME, TKINTER_GAME, QT6_GAME, QT5_GAME], ids=["pygame", "tkinter", "qt6", "qt5"])
+def test_main_loops_are_detected(code):
+    assert _has_main_loop(ast.parse(code))
+
+
+def test_tkinter_game_is_valid():
+    assert validate_code(TKINTER_GAME) is None
+
+
+def test_program_without_main_loop_is_rejected():
+    assert "no main loop" in validate_code("import tkinter as tk\nroot = tk.Tk()\n")
+
+
+def test_syntax_error_is_reported():
+    assert validate_code("def broken(:\n    pass\n").startswith("SyntaxError at line 1")
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import execution_sandbox
+from execution_sandbox import release_stale_display
+
+
+@pytest.fixture
+def x_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(execution_sandbox, "X_SOCKET_PATH", str(tmp_path / "X{}"))
+    monkeypatch.setattr(execution_sandbox, "X_LOCK_PATH", str(tmp_path / ".X{}-lock"))
+    return tmp_path / "X100", tmp_path / ".X100-lock"
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_files_of_a_crashed_server_are_removed(x_paths):
+    socket_path, lock_path = x_paths
+    socket_path.touch()
+    lock_path.write_text(f"{_dead_pid():>10}\n")
+    release_stale_display(100)
+    assert not socket_path.exists() and not lock_path.exists()
+
+
+def test_socket_without_lock_is_removed(x_paths):
+    socket_path, _ = x_paths
+    socket_path.touch()
+    release_stale_display(100)
+    assert not socket_path.exists()
+
+
+def test_display_of_a_running_server_is_in_use(x_paths):
+    socket_path, lock_path = x_paths
+    socket_path.touch()
+    lock_path.write_text(f"{os.getpid():>10}\n")
+    with pytest.raises(RuntimeError, match="already in use"):
+        release_stale_display(100)
+    assert socket_path.exists() and lock_path.exists()
@@ -0,0 +1,22 @@
+import pytest
+
+from execution_sandbox import MAX_EXECUTION_TIMEOUTS, clamp_execution_timeouts
+
+
+def test_overrides_are_capped_at_the_server_maximum():
+    clamped = clamp_execution_timeouts({"window_timeout": 1e9, "poll_interval": 0.2})
+    assert clamped == {"window_timeout": MAX_EXECUTION_TIMEOUTS["window_timeout"], "poll_interval": 0.2}
+
+
+@pytest.mark.parametrize("overrides", [
+    "fast",
+    {"window_timeout": "3"},
+    {"window_timeout": 0},
+    {"window_timeout": -1},
+    {"window_timeout": float("nan")},
+    {"window_timeout": True},
+    {"startup_timeout": 3},
+])
+def test_invalid_overrides_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        clamp_execution_timeouts(overrides)
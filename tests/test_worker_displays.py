@@ -0,0 +1,26 @@
+import multiprocessing
+
+import a2a_worker
+import execution_sandbox
+
+
+def _report_display_range(index, results):
+    # Pretend Xvfb is installed: the pool is only built, never started
+    execution_sandbox.headless_supported = lambda: True
+    pool = a2a_worker.worker_display_pool(index)
+    results.put((index, pool.base, pool.size))
+
+
+def test_worker_processes_get_distinct_displays(monkeypatch):
+    monkeypatch.delenv("A2A_DISPLAY_POOL_SIZE", raising=False)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [context.Process(target=_report_display_range, args=(i, results)) for i in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+    ranges = dict((index, (base, size)) for index, base, size in (results.get(timeout=5) for _ in workers))
+
+    base = execution_sandbox.DISPLAY_BASE
+    assert ranges == {0: (base, 1), 1: (base + 1, 1)}
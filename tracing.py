@@ -0,0 +1,49 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import STEP_SECONDS
+
+
+class Tracer:
+    """
+    Timing spans of one task, attached to its result as "trace".
+    Each span: {"name", "start" (seconds since the task started), "seconds", **attributes}.
+    Spans may be recorded from several threads (Reviewer and Designer run in parallel).
+    Every finished span is also observed in the a2a_step_seconds histogram.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, started, seconds, **attributes):
+        span = {"name": name, "start": round(started - self.started, 3), "seconds": round(seconds, 3)}
+        span.update({key: value for key, value in attributes.items() if value is not None})
+        with self._lock:
+            self.spans.append(span)
+        STEP_SECONDS.observe(seconds, step=name)
+        return span
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the block. Yields a dict the block can fill with more attributes (token counts, outcome, ...)."""
+        started = time.time()
+        attributes = dict(attributes)
+        try:
+            yield attributes
+        except Exception as e:
+            attributes["error"] = str(e)[:200]
+            raise
+        finally:
+            self.add(name, started, time.time() - started, **attributes)
+
+    def summary(self):
+        """{span name: {"count", "seconds"}}: where the task's time went."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                entry = totals.setdefault(span["name"], {"count": 0, "seconds": 0.0})
+                entry["count"] += 1
+                entry["seconds"] = round(entry["seconds"] + span["seconds"], 3)
+        return totals